@@ -0,0 +1,378 @@
+# usr/bin/env python3
+
+# Search for the largest boards that hold no set, sometimes called caps.
+#
+#    search = CapSearch(attributes)
+#    result = search.run()
+#    print(result.size, result.complete)
+#
+# A CapSearch works on the whole deck for a SetSolver's attributes, with
+# cards as their indices in deck order. Boards are Python ints used as
+# bitsets over those indices, and as cards are chosen the search keeps a
+# bitset of every card that would complete a set with them, so no board is
+# ever scored from scratch.
+#
+# The deck splits into slices of smaller decks: fixing one attribute, or in
+# the three variant game any affine hyperplane. The search takes each board
+# by its fullest slice. Symmetries of the deck map any slice to the cards
+# whose first attribute is the first variation, so for each size m of that
+# slice, from largest down, it lists the boards of m cards there that no
+# symmetry of the slice's fixed cards makes repeats of, then fills out the
+# rest of the deck knowing no slice may hold more than m. Each of those
+# fills is a unit of work: pass checkpoint a file path to save progress
+# after each, and to pick a stopped search back up from it. The smaller
+# deck's search, which gives the first m, runs first under the same time
+# limit, and its progress is kept in the same checkpoint.
+
+import json
+import os
+from itertools import combinations, permutations, product
+
+from set_solver import SetSolver, _Deadline, _OutOfTime, _save_json
+
+
+class CapResult(object):
+    ''' Outcome of a CapSearch. cards holds the deck indices of the largest
+        board found with no set; complete is True if the search finished,
+        proving no larger board exists. '''
+    def __init__(self, cards, complete, nodes):
+        self.cards = cards
+        self.size = len(cards)
+        self.complete = complete
+        self.nodes = nodes
+
+    def __repr__(self):
+        return '< CapResult: {} cards; {}; {} nodes >'.format(
+            self.size, 'complete' if self.complete else 'incomplete',
+            self.nodes)
+
+
+class CapSearch(object):
+    ''' Branch and bound search for the largest board with no set.
+        :param attributes: attribute dictionary, as for SetSolver. Games
+        need three or more variations, as with two every pair is a set.
+        :param checkpoint: optional path of a JSON file to save progress to
+        and resume from. '''
+    def __init__(self, attributes, checkpoint=None):
+        self.solver = SetSolver(attributes)
+        self.checkpoint = checkpoint
+        self.hand_size = self.solver._hand_size
+        if self.hand_size < 3:
+            raise ValueError('Every pair is a set with fewer than three '
+                             'variations.')
+        self.num_attributes = len(attributes)
+        self.deck_size = pow(self.hand_size, self.num_attributes)
+        self._all = (1 << self.deck_size) - 1
+        # The slice searched first: cards whose first attribute is the first
+        # variation, which are the first slice_size indices.
+        self.slice_size = self.deck_size // self.hand_size
+        self._first_slice = (1 << self.slice_size) - 1
+
+        self._digits = [self.solver._index_to_digits(index)
+                        for index in range(self.deck_size)]
+        self._weights = [self.solver._digit_weights(digits)
+                         for digits in self._digits]
+        if self.hand_size == 3:
+            self._thirds = [[self.solver._digits_to_index(
+                                 [-(a + b) % 3 for a, b in zip(first, second)])
+                             for second in self._digits]
+                            for first in self._digits]
+        self._slices = self._make_slices()
+        self._smaller = None
+        # The search this one is the smaller deck of, which saves both.
+        self._outer = None
+        # Best board so far, and the slice size and unit to search next;
+        # size None means the smaller deck has still to be searched.
+        self._best = []
+        self._size = None
+        self._unit = 0
+
+    def run(self, max_seconds=None):
+        ''' Search until done or max_seconds have passed, and return a
+            CapResult. An unfinished search saves its place to the
+            checkpoint file, if there is one, for the next run. '''
+        state = self._load_checkpoint()
+        if state is None:
+            self._best, self._size, self._unit = [], None, 0
+        return self._run(_Deadline(max_seconds), state)
+
+    def _run(self, deadline, state):
+        ''' Search on from state, or from where this search stopped if it
+            is None, until done or deadline passes. The search of the
+            smaller deck runs first against the same deadline, and its place
+            is kept in this one's checkpoint. '''
+        if state is not None:
+            if (state['hand_size'], state['num_attributes']) != (
+                    self.hand_size, self.num_attributes):
+                raise ValueError('Checkpoint is for a different deck.')
+            self._best = state['best']
+            self._size, self._unit = state['size'], state['unit']
+        self._deadline = deadline
+
+        if self.num_attributes == 1:
+            self._best = list(range(self.hand_size - 1))
+            self._size, self._unit = 0, 0
+            return CapResult(self._best, True, 0)
+        if self._smaller is None:
+            self._smaller = CapSearch(self._smaller_attributes())
+            self._smaller._outer = self
+        smaller = self._smaller._run(deadline, state and state.get('smaller'))
+        # The smaller deck's best board, in the first slice, is a board of
+        # this deck with no set too: start from it.
+        if len(smaller.cards) > len(self._best):
+            self._best = list(smaller.cards)
+        if not smaller.complete:
+            return CapResult(sorted(self._best), False, deadline.nodes)
+
+        if self._size is None:
+            self._size = smaller.size
+        try:
+            # No slice holds more than size cards, so neither can a board of
+            # more than hand_size * size cards.
+            while self._size and self.hand_size * self._size > len(
+                    self._best):
+                for number, first in enumerate(self._slice_boards(
+                        self._size)):
+                    if number >= self._unit:
+                        self._fill(first, self._size)
+                        self._unit = number + 1
+                        self._save_checkpoint()
+                self._size, self._unit = self._size - 1, 0
+                self._save_checkpoint()
+        except _OutOfTime:
+            self._save_checkpoint()
+            return CapResult(sorted(self._best), False, deadline.nodes)
+        self._size, self._unit = 0, 0
+        self._save_checkpoint()
+        return CapResult(sorted(self._best), True, deadline.nodes)
+
+    def is_cap(self, cards):
+        ''' Check that the deck indices in cards hold no set. '''
+        return not self.solver.has_set([self.solver.compact_card(index)
+                                        for index in cards])
+
+    def _slice_boards(self, size):
+        ''' Generate boards of size cards with no set in the first slice, one
+            per class of boards that the symmetries fixing the seed cards
+            carry into each other. Boards are lists of deck indices.
+
+            The seed is cards every board can be moved to contain. In the
+            three variant game, a board too big to lie flat in the slice can
+            be moved by an affine map to contain the blank card and each card
+            one step from it along one attribute, and those seed cards can
+            then be permuted freely. Otherwise a board can be moved to
+            contain the blank card, which attribute permutations fix. '''
+        smaller = self._smaller
+        if self.hand_size == 3 and size > len(smaller._smaller_best()):
+            seed = [0] + [pow(3, exp)
+                          for exp in range(self.num_attributes - 1)]
+        else:
+            seed = [0]
+        symmetries = self._seed_symmetries(seed)
+
+        chosen, forbidden = self._choose_all(seed)
+        candidates = self._first_slice & ~forbidden & ~self._mask(chosen)
+        seen = set()
+        for board in self._boards_of_size(chosen, candidates, forbidden,
+                                          size):
+            canonical = min(tuple(sorted(symmetry[card] for card in board))
+                            for symmetry in symmetries)
+            if canonical not in seen:
+                seen.add(canonical)
+                yield board
+
+    def _boards_of_size(self, chosen, candidates, forbidden, size):
+        ''' Generate every board of size cards with no set that adds cards
+            from candidates to chosen. '''
+        self._deadline.tick()
+        if len(chosen) == size:
+            yield list(chosen)
+            return
+        while candidates:
+            if len(chosen) + candidates.bit_count() < size:
+                return
+            card = (candidates & -candidates).bit_length() - 1
+            candidates &= candidates - 1
+            card_forbidden = self._forbid(card, chosen, forbidden)
+            yield from self._boards_of_size(chosen + [card],
+                                            candidates & ~card_forbidden,
+                                            card_forbidden, size)
+
+    def _fill(self, first, size):
+        ''' Search the boards whose first slice is exactly the board first,
+            with no slice holding more than size cards. '''
+        chosen, forbidden = self._choose_all(first)
+        if len(chosen) > len(self._best):
+            self._best = list(chosen)
+        candidates = self._all & ~self._first_slice & ~forbidden
+
+        if self.hand_size == 3:
+            # Maps that fix the first slice card by card can move any card
+            # of a bigger board outside it to the blank card of the next
+            # slice, which is index slice_size.
+            card = self.slice_size
+            forbidden = self._forbid(card, chosen, forbidden)
+            chosen = chosen + [card]
+            candidates &= ~forbidden & ~(1 << card)
+        self._extend(chosen, self._mask(chosen), candidates, forbidden, size)
+
+    def _extend(self, chosen, chosen_mask, candidates, forbidden, size):
+        ''' Try every way to add candidates to chosen, depth first, keeping
+            the largest board seen. '''
+        self._deadline.tick()
+        if len(chosen) > len(self._best):
+            self._best = list(chosen)
+        if self._bound(chosen_mask | candidates, size) <= len(self._best):
+            return
+
+        while candidates:
+            if (chosen_mask | candidates).bit_count() <= len(self._best):
+                return
+            card = (candidates & -candidates).bit_length() - 1
+            candidates &= candidates - 1
+            card_forbidden = self._forbid(card, chosen, forbidden)
+            self._extend(chosen + [card], chosen_mask | (1 << card),
+                         candidates & ~card_forbidden, card_forbidden, size)
+
+    def _bound(self, reachable, size):
+        ''' Most cards a board within reachable could hold, if no slice may
+            hold more than size. '''
+        bound = reachable.bit_count()
+        for parallel in self._slices:
+            total = 0
+            for part in parallel:
+                total += min(size, (reachable & part).bit_count())
+            if total < bound:
+                bound = total
+        return bound
+
+    def _forbid(self, card, chosen, forbidden):
+        ''' Add to forbidden every card that would complete a set with card
+            and cards from chosen. '''
+        if self.hand_size == 3:
+            thirds = self._thirds[card]
+            for other in chosen:
+                forbidden |= 1 << thirds[other]
+            return forbidden
+
+        solver = self.solver
+        partial = solver._partial_scores[self.hand_size - 1]
+        completions = solver._completions
+        for others in combinations(chosen, self.hand_size - 2):
+            scores = self._weights[card]
+            for other in others:
+                scores = tuple(map(int.__add__, scores, self._weights[other]))
+            if partial.issuperset(scores):
+                last = solver._digits_to_index([completions[score]
+                                                for score in scores])
+                forbidden |= 1 << last
+        return forbidden
+
+    def _choose_all(self, cards):
+        chosen = []
+        forbidden = 0
+        for card in cards:
+            forbidden = self._forbid(card, chosen, forbidden)
+            chosen.append(card)
+        return chosen, forbidden
+
+    def _make_slices(self):
+        ''' Partition the deck into parallel slices, each a smaller deck. In
+            the three variant game every affine hyperplane direction gives
+            one; otherwise fixing each attribute in turn does. '''
+        if self.hand_size == 3:
+            # One direction per nonzero vector up to sign: take those whose
+            # first nonzero entry is 1.
+            directions = [vector for vector
+                          in product(range(3), repeat=self.num_attributes)
+                          if any(vector)
+                          and [x for x in vector if x][0] == 1]
+        else:
+            directions = [tuple(int(place == attribute)
+                                for place in range(self.num_attributes))
+                          for attribute in range(self.num_attributes)]
+
+        slices = []
+        for direction in directions:
+            parts = [0] * self.hand_size
+            for index, digits in enumerate(self._digits):
+                value = sum(a * b for a, b in zip(direction, digits))
+                parts[value % self.hand_size] |= 1 << index
+            slices.append(parts)
+        return slices
+
+    def _seed_symmetries(self, seed):
+        ''' Return the symmetries of the first slice that map seed onto
+            itself, each as a list taking every deck index in the slice to
+            its image. '''
+        slice_digits = [digits[1:] for digits in
+                        self._digits[:self.slice_size]]
+        dimension = self.num_attributes - 1
+        symmetries = []
+        if len(seed) > 1:
+            # Affine maps permuting the blank card and the unit cards: send
+            # point i of the seed to point order[i], extending linearly.
+            points = [tuple(int(place == exp) for place in range(dimension))
+                      for exp in reversed(range(dimension))]
+            for order in permutations(range(dimension + 1)):
+                images = [(0,) * dimension] + points
+                origin = images[order[0]]
+                steps = [tuple((a - b) % 3 for a, b
+                               in zip(images[order[i + 1]], origin))
+                         for i in range(dimension)]
+                symmetries.append([self._slice_index(tuple(
+                    (origin[place] + sum(digits[dimension - 1 - i]
+                                         * steps[i][place]
+                                         for i in range(dimension))) % 3
+                    for place in range(dimension)))
+                    for digits in slice_digits])
+        else:
+            # Attribute permutations fix the blank card.
+            for order in permutations(range(dimension)):
+                symmetries.append([self._slice_index(
+                    tuple(digits[place] for place in order))
+                    for digits in slice_digits])
+        return symmetries
+
+    def _slice_index(self, digits):
+        return self.solver._digits_to_index((0,) + tuple(digits))
+
+    def _smaller_attributes(self):
+        ''' Attributes for a deck with one attribute fewer, the size of a
+            slice. '''
+        attributes = {'attribute{}'.format(attribute):
+                      list(range(self.hand_size))
+                      for attribute in range(self.num_attributes - 2)}
+        attributes['number'] = list(range(self.hand_size))
+        return attributes
+
+    def _smaller_best(self):
+        return self._smaller._best if self._smaller else [0]
+
+    def _load_checkpoint(self):
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as checkpoint:
+                return json.load(checkpoint)
+        return None
+
+    def _save_checkpoint(self):
+        if self._outer is not None:
+            self._outer._save_checkpoint()
+        elif self.checkpoint:
+            _save_json(self.checkpoint, self._state())
+
+    def _state(self):
+        ''' This search's place, and its smaller deck's, keyed by the shape
+            of the deck each is for. '''
+        return {'hand_size': self.hand_size,
+                'num_attributes': self.num_attributes,
+                'best': sorted(self._best),
+                'size': self._size,
+                'unit': self._unit,
+                'smaller': self._smaller._state() if self._smaller else None}
+
+    def _mask(self, cards):
+        mask = 0
+        for card in cards:
+            mask |= 1 << card
+        return mask
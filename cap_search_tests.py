@@ -0,0 +1,118 @@
+# usr/bin/env python
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from cap_search import CapSearch
+
+
+def make_attributes(variations, attributes):
+    made = {'attribute{}'.format(attribute): list(range(variations))
+            for attribute in range(attributes - 1)}
+    made['number'] = list(range(variations))
+    return made
+
+
+class TestCapSearch(unittest.TestCase):
+
+    def test_known_caps(self):
+        ''' CapSearch should find and prove the largest boards with no set
+            for small three variant games. '''
+        for attributes, size in ((1, 2), (2, 4), (3, 9)):
+            search = CapSearch(make_attributes(3, attributes))
+            result = search.run()
+            self.assertTrue(result.complete)
+            self.assertEqual(result.size, size)
+            self.assertTrue(search.is_cap(result.cards))
+
+    def test_four_variations(self):
+        ''' Games with more variations have their own largest boards; a
+            4 by 4 grid holds at most 9 cards with no set. '''
+        search = CapSearch(make_attributes(4, 2))
+        result = search.run()
+        self.assertTrue(result.complete)
+        self.assertEqual(result.size, 9)
+        self.assertTrue(search.is_cap(result.cards))
+
+    def test_two_variations_fail(self):
+        ''' With two variations every pair is a set, so there is nothing to
+            search. '''
+        self.assertRaises(ValueError, CapSearch, make_attributes(2, 3))
+
+    def test_out_of_time(self):
+        ''' A search that runs out of time should return the best board so
+            far, marked incomplete. '''
+        search = CapSearch(make_attributes(3, 4))
+        result = search.run(max_seconds=0)
+        self.assertFalse(result.complete)
+        self.assertTrue(search.is_cap(result.cards))
+
+    def test_out_of_time_in_smaller_deck(self):
+        ''' The time limit should cover the search of the smaller deck too,
+            returning its best board, which is a board of this deck. '''
+        search = CapSearch(make_attributes(3, 5))
+        start = time.perf_counter()
+        result = search.run(max_seconds=0.5)
+        self.assertLess(time.perf_counter() - start, 2.5)
+        self.assertFalse(result.complete)
+        self.assertGreaterEqual(result.size, 9)
+        self.assertTrue(search.is_cap(result.cards))
+
+    def test_checkpoint_smaller_deck(self):
+        ''' A search stopped in the smaller deck should save that search's
+            place in its checkpoint and carry on from it. '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'caps.json')
+
+        def smaller_place():
+            with open(path) as checkpoint:
+                smaller = json.load(checkpoint)['smaller']
+            self.assertEqual((smaller['hand_size'],
+                              smaller['num_attributes']), (3, 4))
+            return -smaller['size'], smaller['unit']
+
+        CapSearch(make_attributes(3, 5), checkpoint=path).run(max_seconds=1)
+        stopped = smaller_place()
+        CapSearch(make_attributes(3, 5), checkpoint=path).run(max_seconds=1)
+        self.assertGreater(smaller_place(), stopped)
+
+    def test_checkpoint_resume(self):
+        ''' A stopped search should resume from its checkpoint and finish
+            with the same answer as an uninterrupted one. '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'caps.json')
+
+        search = CapSearch(make_attributes(3, 3), checkpoint=path)
+        self.assertFalse(search.run(max_seconds=0).complete)
+        self.assertTrue(os.path.exists(path))
+
+        result = CapSearch(make_attributes(3, 3), checkpoint=path).run()
+        self.assertTrue(result.complete)
+        self.assertEqual(result.size, 9)
+
+        # A finished checkpoint has nothing left to do.
+        again = CapSearch(make_attributes(3, 3), checkpoint=path).run()
+        self.assertTrue(again.complete)
+        self.assertEqual(again.size, 9)
+        self.assertEqual(again.nodes, 0)
+
+    def test_checkpoint_other_deck_fail(self):
+        ''' Resuming from another deck's checkpoint should raise
+            ValueError. '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'caps.json')
+        CapSearch(make_attributes(3, 2), checkpoint=path).run()
+        self.assertRaises(ValueError,
+                          CapSearch(make_attributes(3, 3),
+                                    checkpoint=path).run)
+
+
+if __name__ == '__main__':
+    unittest.main()
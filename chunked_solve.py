@@ -0,0 +1,220 @@
+# usr/bin/env python3
+
+# Solve one very large board within a fixed memory budget, resumably:
+#
+#    solve = ChunkedSolve(solver, cards, checkpoint='run.json',
+#                         memory_budget=pow(2, 26))
+#    result = solve.run(output='sets.jsonl', max_seconds=3600,
+#                       progress=print)
+#
+# Games of eight or more variations have decks of millions of cards, and
+# boards from them hold more sets than fit in memory. Here the hands of a
+# board split into units by their first cards, prefix_size of them, taken
+# in the order combinations() gives them. Each unit is searched with those
+# cards fixed, by the solver's own search, and the sets found are handed to
+# a callback and or appended to a JSON lines file in chunks no bigger than
+# the memory budget allows, never all at once.
+#
+# Pass checkpoint a file path to save progress after each unit and pick a
+# stopped run back up from it. The output file is cut back to its length at
+# the last checkpoint, so no set is written twice; a callback may see the
+# sets of the unit that was interrupted again. Progress reports estimate
+# the work left from the number of hands each remaining unit covers.
+
+import json
+import os
+import sys
+import zlib
+from itertools import combinations, islice
+from math import comb
+from time import perf_counter
+
+from set_solver import _save_json
+
+
+class SolveResult(object):
+    ''' Outcome of a ChunkedSolve run. found counts the sets found, across
+        resumed runs; complete is True once every unit is solved. '''
+    def __init__(self, found, complete, units_done, units):
+        self.found = found
+        self.complete = complete
+        self.units_done = units_done
+        self.units = units
+
+    def __repr__(self):
+        return '< SolveResult: {} sets; {}; {} of {} units >'.format(
+            self.found, 'complete' if self.complete else 'incomplete',
+            self.units_done, self.units)
+
+
+class SolveProgress(object):
+    ''' A progress report: units solved, the share of the board's hands
+        they cover, and the seconds the rest should take at this run's
+        rate, None until a unit has finished. '''
+    def __init__(self, units_done, units, fraction_done, seconds_left,
+                 found):
+        self.units_done = units_done
+        self.units = units
+        self.fraction_done = fraction_done
+        self.seconds_left = seconds_left
+        self.found = found
+
+    def __repr__(self):
+        seconds = ('unknown' if self.seconds_left is None
+                   else '{:.0f}s'.format(self.seconds_left))
+        return ('< SolveProgress: {} of {} units; {:.2%} done; {} left; '
+                '{} sets >'.format(self.units_done, self.units,
+                                   self.fraction_done, seconds, self.found))
+
+
+class ChunkedSolve(object):
+    ''' Memory bounded, resumable search of one board for every set.
+        :param solver: the SetSolver whose deck the cards come from.
+        :param cards: the board, as Cards, CompactCards or deck indices.
+        :param checkpoint: optional path of a JSON file to save progress to
+        and resume from.
+        :param memory_budget: bytes the sets waiting to be handed on may
+        take.
+        :param prefix_size: cards that mark out a unit; more makes smaller
+        units, for finer checkpoints on slow boards. '''
+    def __init__(self, solver, cards, checkpoint=None,
+                 memory_budget=pow(2, 24), prefix_size=1):
+        self.solver = solver
+        self.checkpoint = checkpoint
+        self.hand_size = solver._hand_size
+        self.digits = [solver._index_to_digits(solver.deck_index(card))
+                       for card in cards]
+        if not 1 <= prefix_size < self.hand_size:
+            raise ValueError('prefix_size must be from 1 to one less than '
+                             'the set size.')
+        self.prefix_size = prefix_size
+        # A set waiting in a chunk: its tuple, its positions as ints past
+        # the small int cache, and the chunk's pointer to it.
+        set_bytes = (sys.getsizeof((0,) * self.hand_size)
+                     + sys.getsizeof(pow(2, 30)) * self.hand_size + 8)
+        self.chunk_size = memory_budget // set_bytes
+        if self.chunk_size < 1:
+            raise ValueError('memory_budget cannot hold a single set.')
+
+        num_cards = len(self.digits)
+        self.units = comb(num_cards, prefix_size)
+        self._hands = comb(num_cards, self.hand_size)
+        self._board = zlib.crc32(json.dumps(self.digits).encode())
+
+    def run(self, callback=None, output=None, max_seconds=None,
+            progress=None):
+        ''' Solve units until done or max_seconds have passed, and return a
+            SolveResult. Each chunk of sets, as tuples of board positions,
+            goes to callback and is appended to the file at output, one
+            JSON list per line. progress is called with a SolveProgress
+            after every unit. '''
+        state = self._load_checkpoint()
+        unit, found = state['unit'], state['found']
+        self._output_bytes = state['output_bytes']
+        deadline = None if max_seconds is None else (perf_counter()
+                                                     + max_seconds)
+        output_file = None
+        if output:
+            output_file = open(output, 'a+b')
+            output_file.truncate(state['output_bytes'])
+            output_file.seek(0, os.SEEK_END)
+
+        start = perf_counter()
+        hands_done = self._hands_before(unit)
+        hands_at_start = hands_done
+        chunk = []
+        try:
+            for prefix in islice(self._units(), unit, None):
+                if deadline is not None and perf_counter() > deadline:
+                    break
+                for a_set in self._unit_sets(prefix):
+                    chunk.append(a_set)
+                    if len(chunk) >= self.chunk_size:
+                        self._hand_on(chunk, callback, output_file)
+                        found += len(chunk)
+                        chunk = []
+                self._hand_on(chunk, callback, output_file)
+                found += len(chunk)
+                chunk = []
+                unit += 1
+                hands_done += self._unit_hands(prefix)
+                self._save_checkpoint(unit, found, output_file)
+                if progress is not None:
+                    progress(self._progress(unit, found, hands_done,
+                                            hands_done - hands_at_start,
+                                            perf_counter() - start))
+        finally:
+            if output_file is not None:
+                output_file.close()
+        return SolveResult(found, unit == self.units, unit, self.units)
+
+    def _units(self):
+        return combinations(range(len(self.digits)), self.prefix_size)
+
+    def _unit_sets(self, prefix):
+        ''' Generate the sets whose first cards are at prefix, in order. '''
+        solver = self.solver
+        fixed = tuple(self.digits[position] for position in prefix)
+        scores = [sum(weights) for weights
+                  in zip(*[solver._digit_weights(card_digits)
+                           for card_digits in fixed])]
+        if not solver._partial_scores[len(fixed)].issuperset(scores):
+            return
+        rest = prefix[-1] + 1
+        for hand, lasts in solver._iter_completions(self.digits[rest:],
+                                                    fixed=fixed):
+            hand = prefix + tuple(rest + position for position in hand)
+            for last in lasts:
+                yield hand + (rest + last,)
+
+    def _unit_hands(self, prefix):
+        ''' Return how many hands begin with prefix. '''
+        return comb(len(self.digits) - prefix[-1] - 1,
+                    self.hand_size - self.prefix_size)
+
+    def _hands_before(self, unit):
+        return sum(self._unit_hands(prefix)
+                   for prefix in islice(self._units(), unit))
+
+    def _progress(self, unit, found, hands_done, hands_this_run, elapsed):
+        fraction = hands_done / self._hands if self._hands else 1.0
+        seconds_left = None
+        if hands_this_run:
+            seconds_left = (elapsed / hands_this_run
+                            * (self._hands - hands_done))
+        return SolveProgress(unit, self.units, fraction, seconds_left, found)
+
+    def _hand_on(self, chunk, callback, output_file):
+        if not chunk:
+            return
+        if callback is not None:
+            callback(chunk)
+        if output_file is not None:
+            output_file.write(''.join(json.dumps(a_set) + '\n'
+                                      for a_set in chunk).encode())
+
+    def _load_checkpoint(self):
+        state = {'unit': 0, 'found': 0, 'output_bytes': 0}
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as checkpoint:
+                saved = json.load(checkpoint)
+            if (saved['board'], saved['hand_size'], saved['prefix_size']) != (
+                    self._board, self.hand_size, self.prefix_size):
+                raise ValueError('Checkpoint is for a different search.')
+            state = saved
+        return state
+
+    def _save_checkpoint(self, unit, found, output_file):
+        if not self.checkpoint:
+            return
+        if output_file is not None:
+            # The sets counted must be written before the checkpoint says so.
+            output_file.flush()
+        state = {'board': self._board,
+                 'hand_size': self.hand_size,
+                 'prefix_size': self.prefix_size,
+                 'unit': unit,
+                 'found': found,
+                 'output_bytes': (output_file.tell() if output_file
+                                  else self._output_bytes)}
+        _save_json(self.checkpoint, state)
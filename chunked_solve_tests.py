@@ -0,0 +1,138 @@
+# usr/bin/env python
+
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from chunked_solve import ChunkedSolve
+from play_set import three_hand, five_hand
+from set_solver import SetRules, SetSolver
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def make_board(solver, size=30):
+    ''' Deal a board with repeated cards, so it holds plenty of sets. '''
+    board = solver.deal_game(size // 3) * 2 + solver.deal_game(size // 3)
+    random.shuffle(board)
+    return board
+
+
+class TestChunkedSolve(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.directory, 'run.json')
+        self.output = os.path.join(self.directory, 'sets.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def expected(self, solver, board):
+        digits = solver._encode_board(board)
+        return [hand + (last,) for hand, lasts
+                in solver._iter_completions(digits) for last in lasts]
+
+    def read_output(self):
+        with open(self.output) as output:
+            return [tuple(json.loads(line)) for line in output]
+
+    def test_matches_search(self):
+        ''' Chunks should hold every set, in order, none bigger than the
+            memory budget allows, whatever the unit size. '''
+        for attributes, rules in ((three_hand, None),
+                                  (five_hand, SetRules(3)),
+                                  (five_hand, SetRules(3, default='same'))):
+            solver = SetSolver(attributes, rules)
+            board = make_board(solver)
+            for prefix_size in (1, 2):
+                chunks = []
+                solve = ChunkedSolve(solver, board, memory_budget=4096,
+                                     prefix_size=prefix_size)
+                result = solve.run(callback=chunks.append)
+                self.assertTrue(result.complete)
+                self.assertTrue(all(0 < len(chunk) <= solve.chunk_size
+                                    for chunk in chunks))
+                found = [a_set for chunk in chunks for a_set in chunk]
+                self.assertEqual(found, self.expected(solver, board))
+                self.assertEqual(result.found, len(found))
+
+    def test_resume(self):
+        ''' A run stopped part way should resume from its checkpoint and
+            leave each set in the output once. '''
+        solver = SetSolver(three_hand)
+        board = make_board(solver, 45)
+
+        class Stop(Exception):
+            pass
+
+        calls = []
+
+        def stop_later(chunk):
+            calls.append(chunk)
+            if len(calls) == 5:
+                raise Stop()
+
+        solve = ChunkedSolve(solver, board, self.checkpoint,
+                             memory_budget=2048)
+        self.assertRaises(Stop, solve.run, stop_later, self.output)
+        stopped = ChunkedSolve(solver, board, self.checkpoint,
+                               memory_budget=2048).run(max_seconds=0)
+        self.assertFalse(stopped.complete)
+        self.assertGreater(stopped.units_done, 0)
+
+        result = ChunkedSolve(solver, board, self.checkpoint,
+                              memory_budget=2048).run(output=self.output)
+        self.assertTrue(result.complete)
+        self.assertEqual(self.read_output(), self.expected(solver, board))
+        self.assertEqual(result.found, len(self.expected(solver, board)))
+
+        # A finished run has nothing left to do.
+        again = ChunkedSolve(solver, board, self.checkpoint).run(
+            output=self.output)
+        self.assertEqual((again.found, again.complete),
+                         (result.found, True))
+        self.assertEqual(len(self.read_output()), result.found)
+
+        self.assertRaises(ValueError, ChunkedSolve(
+            solver, board[1:], self.checkpoint).run)
+
+    def test_progress(self):
+        ''' Progress should cover the board's hands by the last unit. '''
+        solver = SetSolver(three_hand)
+        reports = []
+        ChunkedSolve(solver, make_board(solver)).run(progress=reports.append)
+        self.assertEqual(len(reports), 30)
+        fractions = [report.fraction_done for report in reports]
+        self.assertEqual(fractions, sorted(fractions))
+        self.assertAlmostEqual(fractions[-1], 1.0)
+        self.assertEqual(reports[-1].seconds_left, 0)
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_dealt_boards(self):
+        ''' Rows of deal_boards should solve as the same deck indices. '''
+        solver = SetSolver(three_hand)
+        row = solver.deal_boards(1, 15)[0]
+        board = [solver.compact_card(int(index)) for index in row]
+        chunks = []
+        ChunkedSolve(solver, row).run(callback=chunks.append)
+        self.assertEqual([a_set for chunk in chunks for a_set in chunk],
+                         self.expected(solver, board))
+
+    def test_bad_arguments(self):
+        solver = SetSolver(three_hand)
+        board = make_board(solver)
+        self.assertRaises(ValueError, ChunkedSolve, solver, board,
+                          prefix_size=3)
+        self.assertRaises(ValueError, ChunkedSolve, solver, board,
+                          memory_budget=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+# usr/bin/env python3
+
+# Search a game of Set for the best set to take: the one after which the
+# most sets can be taken before the deck runs out.
+#
+#    search = GameSearch(game.solver)
+#    result = search.search(game, max_seconds=1.0)
+#    print(result.move, result.value, result.exact)
+#    game.check(search.hint(game))
+#
+# The deck's order is fixed once it is shuffled, so a game's state is the
+# set of visible cards and how far into the deck dealing has got. States are
+# kept as a bitset of visible deck indices and that count, which together
+# key a transposition table: the many orders of taking the same sets meet in
+# the same states and are only searched once. Each state's sets are worked
+# out from its parent's, keeping those the taken set did not touch and
+# searching only for sets with the newly dealt cards.
+#
+# The search deepens one set at a time, so a time budget still leaves the
+# best move of the deepest search finished. Within a depth, a state's value
+# can be no more than the depth, or than its cards over the set size, so a
+# move reaching either stops the state's search early; reaching the second
+# is known to be best at any depth.
+
+from itertools import count
+
+from set_solver import _Deadline, _OutOfTime
+
+
+class SearchResult(object):
+    ''' Outcome of a GameSearch. move holds the deck indices of the set to
+        take, the first set found if no depth finished in time, or None if
+        there is none; value is how many sets, this one
+        included, best play takes before the game ends, or within depth
+        sets if the search stopped short of that; exact is True if value is
+        the best possible whatever the depth. '''
+    def __init__(self, move, value, depth, exact, nodes):
+        self.move = move
+        self.value = value
+        self.depth = depth
+        self.exact = exact
+        self.nodes = nodes
+
+    def __repr__(self):
+        return ('< SearchResult: {} for {} sets; depth {}; {}; {} nodes >'
+                .format(self.move, self.value, self.depth,
+                        'exact' if self.exact else 'inexact', self.nodes))
+
+
+class GameSearch(object):
+    ''' Iterative deepening search of a Game's remaining play, with a
+        transposition table over game states.
+        :param solver: the SetSolver of the games to search.
+        :param max_entries: most states, and most boards' sets, to
+        remember. The tables are kept across searches of the same deck,
+        so searching again after each move reuses the work. '''
+    def __init__(self, solver, max_entries=pow(2, 20)):
+        self.solver = solver
+        self.max_entries = max_entries
+        self.hand_size = solver._hand_size
+        # State key (visible bitset, cards dealt) to (value, exact, move,
+        # depth), for the deck and table size in _game.
+        self._table = dict()
+        self._game = None
+        # Sets of each board, as (bitset, deck indices) pairs, by its bitset
+        self._board_sets = dict()
+        self._digits = dict()
+        self._deadline = _Deadline()
+
+    def search(self, game, max_depth=None, max_seconds=None):
+        ''' Search game's remaining play, deepening a set at a time until
+            the value is exact, max_depth sets deep or max_seconds have
+            passed, and return the SearchResult of the deepest search
+            finished. '''
+        mask, deck, top = self._load(game)
+        self._deadline = _Deadline(max_seconds)
+        sets = self._sets(mask)
+
+        result = SearchResult(None, 0, 0, False, 0)
+        try:
+            for depth in count(1):
+                if max_depth is not None and depth > max_depth:
+                    break
+                value, exact, move = self._search(mask, top, sets, depth)
+                result = SearchResult(move, value, depth, exact,
+                                      self._deadline.nodes)
+                if exact:
+                    break
+        except _OutOfTime:
+            result.nodes = self._deadline.nodes
+        if result.move is None and sets:
+            # Out of time before a move was searched: any set is legal.
+            result.move = sets[0][1]
+        return result
+
+    def hint(self, game, max_depth=None, max_seconds=None):
+        ''' Return the best set to take from game's visible cards, as a
+            tuple of them, or None if there is no set. '''
+        move = self.search(game, max_depth, max_seconds).move
+        if move is None:
+            return None
+        by_index = {self.solver.deck_index(card): card
+                    for card in game.visible}
+        return tuple(by_index[index] for index in move)
+
+    def _load(self, game):
+        ''' Return a game's visible bitset, its deck as deck indices and how
+            many of them are dealt, starting a fresh transposition table for
+            a new deck. '''
+        deck = tuple(self.solver.deck_index(card) for card in game.deck.cards)
+        if (deck, game.num_cards) != self._game:
+            self._game = (deck, game.num_cards)
+            self._table.clear()
+        mask = 0
+        for card in game.visible:
+            mask |= 1 << self.solver.deck_index(card)
+        return mask, deck, game.deck._top
+
+    def _search(self, mask, top, sets, depth):
+        ''' Return the value of a state searched depth sets deep, whether
+            it is exact, and the move that reaches it. '''
+        key = (mask, top)
+        entry = self._table.get(key)
+        # A deeper search's value may count more than depth sets, so only
+        # an exact value, or one searched as deep, can be reused.
+        if entry is not None and (entry[1] or entry[3] == depth):
+            return entry[:3]
+        self._deadline.tick()
+        deck, num_cards = self._game
+        hand_size = self.hand_size
+
+        if not sets:
+            # No set to take: deal more, as Game.deal_more does, or stop.
+            if top >= len(deck):
+                result = (0, True, None)
+            else:
+                dealt = deck[top:top + hand_size]
+                child = self._deal(mask, sets, dealt)
+                value, exact, _ = self._search(child, top + len(dealt),
+                                               self._sets(child), depth)
+                result = (value, exact, None)
+        elif depth == 0:
+            return 0, False, None
+        else:
+            bound = (bin(mask).count('1') + len(deck) - top) // hand_size
+            # No more than depth sets are counted, so a move reaching that
+            # is as good as any.
+            enough = min(bound, depth)
+            moves = sets
+            if entry is not None and entry[2] is not None:
+                # Try the best move of a shallower search first.
+                moves = sorted(sets, key=lambda a_set: a_set[1] != entry[2])
+            best, best_move, all_exact = -1, None, True
+            for tried, (set_mask, a_set) in enumerate(moves, 1):
+                child, child_top = mask & ~set_mask, top
+                kept = [other for other in sets if not other[0] & set_mask]
+                if bin(child).count('1') < num_cards and top < len(deck):
+                    # As Game.check does, replace the set from the deck.
+                    dealt = deck[top:top + len(a_set)]
+                    child_top += len(dealt)
+                    child = self._deal(child, kept, dealt)
+                else:
+                    self._remember(child, kept)
+                value, exact, _ = self._search(child, child_top,
+                                               self._sets(child), depth - 1)
+                all_exact = all_exact and exact
+                if value + 1 > best:
+                    best, best_move = value + 1, a_set
+                if best == enough:
+                    break
+            # Moves left untried might do better past depth.
+            all_exact = all_exact and tried == len(moves)
+            result = (best, all_exact or best == bound, best_move)
+
+        if entry is not None or len(self._table) < self.max_entries:
+            self._table[key] = result + (depth,)
+        return result
+
+    def _sets(self, mask):
+        ''' Return the sets on board mask, solving it if no parent left
+            them in the table. '''
+        sets = self._board_sets.get(mask)
+        if sets is None:
+            self._deal(0, [], [index for index in range(mask.bit_length())
+                               if mask >> index & 1])
+            sets = self._board_sets[mask]
+        return sets
+
+    def _deal(self, mask, sets, dealt):
+        ''' Add the cards dealt to board mask, whose sets are given, and
+            remember the new board's sets: those already there, and for
+            each card dealt the sets it makes with the cards before it.
+            Returns the new board's bitset. '''
+        solver = self.solver
+        sets = list(sets)
+        board = [index for index in range(mask.bit_length())
+                 if mask >> index & 1]
+        for card in dealt:
+            digits = [self._card_digits(index) for index in board]
+            for prefix, lasts in solver._iter_completions(
+                    digits, fixed=(self._card_digits(card),)):
+                hand = [board[position] for position in prefix]
+                for last in lasts:
+                    a_set = tuple(sorted(hand + [board[last], card]))
+                    set_mask = 0
+                    for index in a_set:
+                        set_mask |= 1 << index
+                    sets.append((set_mask, a_set))
+            board.append(card)
+            mask |= 1 << card
+        self._remember(mask, sorted(sets, key=lambda a_set: a_set[1]))
+        return mask
+
+    def _remember(self, mask, sets):
+        if len(self._board_sets) < self.max_entries:
+            self._board_sets[mask] = sets
+        else:
+            # Full: keep only the board being searched next.
+            self._board_sets = {mask: sets}
+
+    def _card_digits(self, index):
+        digits = self._digits.get(index)
+        if digits is None:
+            digits = self._digits[index] = self.solver._index_to_digits(index)
+        return digits
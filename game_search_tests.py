@@ -0,0 +1,111 @@
+# usr/bin/env python
+
+import unittest
+
+from game_search import GameSearch
+from set_solver import ATTRIBS, SetRules, SetSolver, Deck, Game, simulate_game
+
+
+def best_play(solver, visible, deck, top, num_cards):
+    ''' Score every line of play from scratch, by the rules Game plays. '''
+    sets = solver.find_all_sets(visible)
+    if not sets:
+        if top >= len(deck):
+            return 0
+        dealt = deck[top:top + solver._hand_size]
+        return best_play(solver, visible + dealt, deck, top + len(dealt),
+                         num_cards)
+    best = 0
+    for a_set in sets:
+        left = [card for card in visible if card not in a_set]
+        left_top = top
+        if len(left) < num_cards and top < len(deck):
+            left += deck[top:top + len(a_set)]
+            left_top += len(a_set)
+        best = max(best, 1 + best_play(solver, left, deck, left_top,
+                                       num_cards))
+    return best
+
+
+def play_hints(search, game):
+    ''' Play game to the end taking the hinted set, returning sets taken. '''
+    taken = 0
+    while True:
+        hint = search.hint(game)
+        if hint:
+            game.check(hint)
+            taken += 1
+        elif not game.deal_more():
+            return taken
+
+
+class TestGameSearch(unittest.TestCase):
+
+    def test_matches_every_line(self):
+        ''' The search should find the best play that trying every line of
+            play finds. '''
+        solver = SetSolver(ATTRIBS)
+        for seed in range(6):
+            deck = Deck(size=24, seed=seed)
+            game = Game(9, deck, solver)
+            result = GameSearch(solver).search(game)
+            self.assertTrue(result.exact)
+            self.assertEqual(result.value,
+                             best_play(solver, list(game.visible),
+                                       deck.cards, deck._top, 9))
+
+    def test_hints_reach_value(self):
+        ''' Taking every hint should take as many sets as the search says,
+            at least as many as taking the first set found. '''
+        solver = SetSolver(ATTRIBS)
+        game = Game(12, Deck(seed=1), solver)
+        search = GameSearch(solver)
+        result = search.search(game)
+        self.assertTrue(result.exact)
+        self.assertEqual(play_hints(search, game), result.value)
+        self.assertGreaterEqual(result.value,
+                                simulate_game(seed=1, solver=solver)[0])
+
+    def test_other_rules(self):
+        ''' Games under other rules should be searched by their rules. '''
+        five_hand = {'colors': ['red', 'blue', 'yellow', 'green', 'purple'],
+                     'shape':  ['circle', 'square', 'diamond', 'oval', 'zig'],
+                     'number': ['one', 'two', 'three', 'four', 'five']}
+        solver = SetSolver(five_hand, SetRules(3))
+        deck = Deck(size=15, attribs=five_hand, seed=2)
+        game = Game(6, deck, solver)
+        result = GameSearch(solver).search(game)
+        self.assertTrue(result.exact)
+        self.assertEqual(result.value,
+                         best_play(solver, list(game.visible), deck.cards,
+                                   deck._top, 6))
+
+    def test_depth_and_time_budgets(self):
+        ''' Budgets should stop the search with the deepest result
+            finished, and a later search should reuse the table. '''
+        solver = SetSolver(ATTRIBS)
+        game = Game(12, Deck(seed=3), solver)
+        search = GameSearch(solver)
+
+        shallow = search.search(game, max_depth=2)
+        self.assertLessEqual(shallow.depth, 2)
+        self.assertLessEqual(shallow.value, 2)
+
+        stopped = search.search(game, max_seconds=0)
+        self.assertLessEqual(stopped.nodes, 1)
+        # Even with no time, a board with sets gets a legal hint.
+        self.assertIn(set(search.hint(game, max_seconds=0)),
+                      [set(a_set) for a_set in game.sets()])
+
+        # A deeper search's values are not reported at a shallower depth.
+        search.search(game, max_depth=2)
+        self.assertLessEqual(search.search(game, max_depth=1).value, 1)
+
+        first = search.search(game)
+        again = search.search(game)
+        self.assertEqual((again.move, again.value), (first.move, first.value))
+        self.assertLess(again.nodes, first.nodes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -38,6 +38,25 @@ def get_random_attributes(depth):
     return n_hand
 
 
+def profile_solve(solver, num_of_cards=24, capture='cprofile', limit=15):
+    ''' Deal a game and solve it with instrumentation on, printing the
+        search counters and the top of a cProfile or tracemalloc capture. '''
+    game = solver.deal_game(num_of_cards)
+    with solver.instrumented(capture=capture) as record:
+        solver.find_all_sets(game)
+
+    for stats in record.calls:
+        print(stats)
+        for attribute, rejected in stats.rejections.most_common():
+            print('    rejected on {}: {}'.format(attribute, rejected))
+    if record.profile:
+        record.profile.sort_stats('cumulative').print_stats(limit)
+    if record.snapshot:
+        for line in record.snapshot.statistics('lineno')[:limit]:
+            print(line)
+    return record
+
+
 def main():
     print('''Play a game of Set by instantiating a Solver with either the preset
 card attributes, or with randomly generated ones:
@@ -53,6 +72,9 @@ the passed parameter depth:
 
    n_depth_attributes = get_random_attributes(depth=n)
 
+To see where a solve spends its time, try profile_solve(five_solver), or
+pass capture='tracemalloc' for memory.
+
 Preloaded solvers are three_solver, four_solver, five_solver.
 
 HAVE FUN.''')
@@ -72,9 +94,23 @@ five_hand  = {'colors': ['red', 'blue', 'yellow', 'green', 'purple'],
               'fill':   ['none', 'stripe', 'solid', 'polkadot', 'zag'],
               'number': ['one', 'two', 'three', 'four', 'five']}
 
-three_solver = SetSolver(three_hand)
-four_solver = SetSolver(four_hand)
-five_solver = SetSolver(five_hand)
+# Preloaded solvers, made on first use so importing this module stays cheap
+_preset_solvers = {'three_solver': three_hand,
+                   'four_solver': four_hand,
+                   'five_solver': five_hand}
+
+
+def __getattr__(name):
+    if name in _preset_solvers:
+        solver = globals()[name] = SetSolver(_preset_solvers[name])
+        return solver
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__,
+                                                                    name))
+
 
 if __name__ == '__main__':
+    # Bare names in the interactive session never reach __getattr__.
+    three_solver = SetSolver(three_hand)
+    four_solver = SetSolver(four_hand)
+    five_solver = SetSolver(five_hand)
     main()
\ No newline at end of file
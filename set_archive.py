@@ -0,0 +1,210 @@
+# usr/bin/env python3
+
+# A compact binary format for boards, decks and game histories.
+#
+#    with ArchiveWriter(open('games.set', 'wb'), attributes) as archive:
+#        archive.write_deck(deck)
+#        archive.write_set(a_set)
+#
+#    with Archive('games.set') as archive:
+#        for record in archive:
+#            print(record.kind, len(record.cards))
+#
+# A file starts with a header holding the format version and the attribute
+# schema, once, as JSON. Records follow, each a kind, a card count and one
+# extra number, then the cards as deck indices in the schema's deck order,
+# packed into one byte each for decks of up to 256 cards, and two or four
+# byte little-endian integers for larger ones.
+#
+# Reading maps the file and hands out each record's cards as a memoryview
+# over the mapping, so no Python object is made per card until asked for.
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from set_solver import Deck, SetSolver
+
+
+VERSION = 1
+MAGIC = b'SETARCH'
+
+# Record kinds. A deck record's extra number is how many cards have been
+# dealt from it; other records leave it 0.
+BOARD = 0
+DECK = 1
+SET = 2
+
+_HEADER = struct.Struct('<7sBBI')
+_RECORD = struct.Struct('<BII')
+_TYPECODES = {1: 'B', 2: 'H', 4: 'I'}
+
+
+def card_width(attributes):
+    ''' Return the bytes each card takes in an archive of attributes. '''
+    deck_size = pow(len(next(iter(attributes.values()))), len(attributes))
+    for width in sorted(_TYPECODES):
+        if deck_size <= pow(256, width):
+            return width
+    raise ValueError('A deck of {} cards is too large.'.format(deck_size))
+
+
+class Record(object):
+    ''' One record read from an Archive: its kind, its extra number, and its
+        cards as a memoryview of deck indices. '''
+    __slots__ = ('kind', 'extra', 'cards')
+
+    def __init__(self, kind, extra, cards):
+        self.kind = kind
+        self.extra = extra
+        self.cards = cards
+
+    def __repr__(self):
+        return '< Record: kind {}; {} cards >'.format(self.kind,
+                                                      len(self.cards))
+
+
+class ArchiveWriter(object):
+    ''' Write an archive to a binary file object, starting with the header.
+        Cards may be Cards, CompactCards or deck indices.
+        :param stream: file object opened for binary writing.
+        :param attributes: attribute dictionary, as for SetSolver. '''
+    def __init__(self, stream, attributes):
+        self.stream = stream
+        self.solver = SetSolver(attributes)
+        self.width = card_width(attributes)
+        schema = json.dumps([[attribute, variations] for attribute, variations
+                             in attributes.items()]).encode('utf-8')
+        stream.write(_HEADER.pack(MAGIC, VERSION, self.width, len(schema)))
+        stream.write(schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stream.close()
+
+    def write_board(self, cards):
+        self._write(BOARD, 0, cards)
+
+    def write_set(self, cards):
+        self._write(SET, 0, cards)
+
+    def write_deck(self, deck):
+        ''' Write a Deck's cards in dealing order, and how many are dealt. '''
+        self._write(DECK, deck.size - len(deck), deck.cards)
+
+    def _write(self, kind, extra, cards):
+        indices = [self.solver.deck_index(card) for card in cards]
+        self.stream.write(_RECORD.pack(kind, len(indices), extra))
+        self.stream.write(b''.join(index.to_bytes(self.width, 'little')
+                                   for index in indices))
+
+
+
+class Archive(object):
+    ''' Read an archive by mapping it into memory. Iterating gives its
+        Records in order, and they can be indexed too.
+        :param path: the archive file. '''
+    def __init__(self, path):
+        with open(path, 'rb') as archive_file:
+            self._mmap = mmap.mmap(archive_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        try:
+            self._read_header(path)
+            self._offsets = self._find_records(path)
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __iter__(self):
+        for number in range(len(self._offsets)):
+            yield self[number]
+
+    def __getitem__(self, number):
+        offset = self._offsets[number]
+        kind, count, extra = _RECORD.unpack_from(self._view, offset)
+        start = offset + _RECORD.size
+        cards = self._view[start:start + count * self.width]
+        if sys.byteorder == 'little':
+            cards = cards.cast(self._typecode)
+        else:
+            # Big-endian machines need a swapped copy.
+            cards = array(self._typecode, bytes(cards))
+            cards.byteswap()
+        return Record(kind, extra, cards)
+
+    def close(self):
+        ''' Release the mapping. Records' card views still held stay
+            readable, and the mapping closes when the last is dropped. '''
+        if self._mmap is not None:
+            self._view.release()
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Card views still point into it; the last one to go
+                # unmaps it.
+                pass
+            self._mmap = None
+
+    def boards(self):
+        ''' Generate the cards of each board record. '''
+        return (record.cards for record in self if record.kind == BOARD)
+
+    def decode(self, cards):
+        ''' Return Cards for the deck indices in cards. '''
+        return [self.solver.decode_card(self.solver.compact_card(index))
+                for index in cards]
+
+    def deck(self, record):
+        ''' Rebuild the Deck a deck record was written from. '''
+        deck = Deck(attribs=self.attributes, shuffle=False)
+        deck.cards = self.decode(record.cards)
+        deck.size = len(deck.cards)
+        deck._top = record.extra
+        return deck
+
+    def _read_header(self, path):
+        if len(self._view) < _HEADER.size:
+            raise ValueError('{} is not a set archive.'.format(path))
+        magic, version, width, schema_size = _HEADER.unpack_from(self._view)
+        if magic != MAGIC:
+            raise ValueError('{} is not a set archive.'.format(path))
+        if version > VERSION:
+            raise ValueError('{} is archive version {}, newer than this '
+                             'reader.'.format(path, version))
+        schema = bytes(self._view[_HEADER.size:_HEADER.size + schema_size])
+        # Attributes keep their order and types, so cards decode exactly.
+        self.attributes = {attribute: variations for attribute, variations
+                           in json.loads(schema.decode('utf-8'))}
+        self.solver = SetSolver(self.attributes)
+        self.version = version
+        self.width = width
+        self._typecode = _TYPECODES[width]
+        self._start = _HEADER.size + schema_size
+
+    def _find_records(self, path):
+        ''' Return the offset of each record, reading only their headers. '''
+        offsets = []
+        offset = self._start
+        while offset < len(self._view):
+            if offset + _RECORD.size > len(self._view):
+                raise ValueError('{} is cut short.'.format(path))
+            kind, count, extra = _RECORD.unpack_from(self._view, offset)
+            offsets.append(offset)
+            offset += _RECORD.size + count * self.width
+        if offset > len(self._view):
+            raise ValueError('{} is cut short.'.format(path))
+        return offsets
@@ -0,0 +1,139 @@
+# usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from play_set import get_random_attributes, three_hand, five_hand
+from set_archive import (Archive, ArchiveWriter, BOARD, DECK, SET, VERSION,
+                         card_width)
+from set_solver import Deck, Game, SetSolver
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'games.set')
+
+    def test_boards(self):
+        ''' Boards of Cards, CompactCards or indices should read back as
+            the same deck indices and decode to equal cards. '''
+        for attributes in (three_hand, five_hand):
+            solver = SetSolver(attributes)
+            cards = solver.deal_game(12)
+            indices = [solver.encode_card(card).index for card in cards]
+            with ArchiveWriter(open(self.path, 'wb'), attributes) as writer:
+                writer.write_board(cards)
+                writer.write_board([solver.encode_card(card)
+                                    for card in cards])
+                writer.write_board(indices)
+                writer.write_board([])
+
+            with Archive(self.path) as archive:
+                self.assertEqual(len(archive), 4)
+                self.assertEqual(archive.width, card_width(attributes))
+                self.assertEqual(archive.attributes, attributes)
+                boards = [board.tolist() for board in archive.boards()]
+                self.assertEqual(boards, [indices] * 3 + [[]])
+                self.assertEqual([card.attributes for card
+                                  in archive.decode(boards[0])],
+                                 [card.attributes for card in cards])
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_dealt_boards(self):
+        ''' Rows of deal_boards should write as their deck indices. '''
+        solver = SetSolver(five_hand)
+        rows = solver.deal_boards(3, 12)
+        with ArchiveWriter(open(self.path, 'wb'), five_hand) as writer:
+            for row in rows:
+                writer.write_board(row)
+        with Archive(self.path) as archive:
+            self.assertEqual([list(record.cards) for record in archive],
+                             rows.tolist())
+
+    def test_game_history(self):
+        ''' A dealt deck and the sets taken from it should round-trip. '''
+        deck = Deck(seed=3)
+        game = Game(deck=deck)
+        with ArchiveWriter(open(self.path, 'wb'), deck.attribs) as writer:
+            writer.write_deck(deck)
+            for a_set in game.sets()[:2]:
+                writer.write_set(a_set)
+
+        with Archive(self.path) as archive:
+            kinds = [record.kind for record in archive]
+            read_deck = archive.deck(archive[0])
+            sets = [archive.decode(record.cards) for record in archive
+                    if record.kind == SET]
+
+        self.assertEqual(kinds[0], DECK)
+        self.assertNotIn(BOARD, kinds)
+        self.assertEqual(len(read_deck), len(deck))
+        self.assertEqual([card.attributes for card in read_deck.cards],
+                         [card.attributes for card in deck.cards])
+        self.assertEqual([[card.attributes for card in a_set]
+                          for a_set in sets],
+                         [[card.attributes for card in a_set]
+                          for a_set in game.sets()[:2]])
+
+    def test_close_with_live_records(self):
+        ''' Leaving the with block should not fail while records from the
+            loop are still held, and their cards should stay readable. '''
+        with ArchiveWriter(open(self.path, 'wb'), three_hand) as writer:
+            writer.write_board(range(12))
+            writer.write_board(range(12, 24))
+
+        with Archive(self.path) as archive:
+            for record in archive:
+                cards = record.cards
+        self.assertEqual(cards.tolist(), list(range(12, 24)))
+        archive.close()
+
+    def test_exact_attributes(self):
+        ''' Attribute names and variations keep their types and order. '''
+        attributes = get_random_attributes(3)
+        with ArchiveWriter(open(self.path, 'wb'), attributes) as writer:
+            writer.write_board(range(81))
+        with Archive(self.path) as archive:
+            self.assertEqual(list(archive.attributes.items()),
+                             list(attributes.items()))
+            self.assertEqual(archive.width, 1)
+            self.assertEqual(archive[0].cards.tolist(), list(range(81)))
+
+    def test_bad_files(self):
+        ''' Files that are not archives, are from a newer version or are
+            cut short should raise ValueError. '''
+        with ArchiveWriter(open(self.path, 'wb'), three_hand) as writer:
+            writer.write_board(range(12))
+        with open(self.path, 'rb') as archive_file:
+            data = archive_file.read()
+
+        bad = os.path.join(self.directory, 'bad.set')
+        for contents in (b'not an archive', b'SETARCH' + bytes([VERSION + 1])
+                         + data[8:], data[:-1]):
+            with open(bad, 'wb') as bad_file:
+                bad_file.write(contents)
+            self.assertRaises(ValueError, Archive, bad)
+
+    def test_cards_not_in_deck(self):
+        ''' Indices outside the deck should raise ValueError, writing
+            nothing of the record. '''
+        with ArchiveWriter(open(self.path, 'wb'), three_hand) as writer:
+            for board in ([0, 81], [-1], [pow(2, 40)]):
+                self.assertRaises(ValueError, writer.write_board, board)
+            writer.write_board([0, 80])
+        with Archive(self.path) as archive:
+            self.assertEqual([list(record.cards) for record in archive],
+                             [[0, 80]])
+
+
+if __name__ == '__main__':
+    unittest.main()
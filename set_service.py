@@ -0,0 +1,338 @@
+# usr/bin/env python3
+
+# An asyncio service that solves boards for many clients at once:
+#
+#    python3 set_service.py --preset five --port 8765 --workers 4
+#
+# Clients connect over TCP or a UNIX socket and send one JSON object per
+# line, {"id": 1, "cards": [...]}, with cards in any form solve_boards.py
+# reads, and get back {"id": 1, "sets": [[0, 4, 9], ...]} with the sets as
+# positions on their board, as soon as that board is solved. Requests on
+# one connection may be pipelined; answers carry the request's id.
+# {"metrics": true} gets the service's metrics instead.
+#
+# Requests from every client are gathered into micro-batches: the first
+# board waits at most batch_delay seconds for others to join it, then the
+# batch goes to a process pool. Boards are keyed by their sorted cards, so
+# the same board asked for by several clients while it is queued or being
+# solved is solved once. Small boards are not left queued behind big ones,
+# as several batches may be solving at once.
+
+import argparse
+import asyncio
+import json
+import os
+from collections import deque
+from time import perf_counter
+
+import solve_boards
+from set_solver import SetSolver
+from solve_boards import PRESETS, BoardReader, solve_board, _init_worker
+
+
+class SetService(object):
+    ''' Batching, deduplicating front end to SetSolver.
+        :param attributes: attribute dictionary, as for SetSolver.
+        :param workers: solver processes, default one per CPU; 0 solves in
+        a thread of this process instead.
+        :param max_batch: most boards sent to a worker at once.
+        :param batch_delay: seconds a batch waits to fill.
+        :param latency_window: how many recent latencies metrics cover. '''
+    def __init__(self, attributes, workers=None, max_batch=64,
+                 batch_delay=0.002, latency_window=10000):
+        self.attributes = attributes
+        self.solver = SetSolver(attributes)
+        self.workers = workers
+        self.max_batch = max_batch
+        self.batch_delay = batch_delay
+        self.address = None
+        self._reader = BoardReader(self.solver, None)
+        self._queue = None
+        self._pending = dict()
+        self._in_flight = None
+        self._tasks = set()
+        # Writers of open client connections, by the task serving them
+        self._connections = dict()
+        self._executor = None
+        self._server = None
+        self._batcher = None
+
+        self._latencies = deque(maxlen=latency_window)
+        self.requests = 0
+        self.deduplicated = 0
+        self.boards_solved = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        ''' Start the pool and listen on host and port, or on a UNIX socket
+            at path. address is set to where the service is listening. '''
+        if self.workers == 0:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(1)
+            slots = 1
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(
+                self.workers, initializer=_init_worker,
+                initargs=(self.attributes, None))
+            slots = self.workers or os.cpu_count() or 1
+        # Batches solving at once: enough to keep every worker busy while
+        # the next batch gathers.
+        self._in_flight = asyncio.Semaphore(2 * slots)
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.ensure_future(self._gather_batches())
+
+        if path:
+            self._server = await asyncio.start_unix_server(self._serve, path)
+            self.address = path
+        else:
+            self._server = await asyncio.start_server(self._serve, host, port)
+            self.address = self._server.sockets[0].getsockname()[:2]
+        return self
+
+    async def close(self):
+        ''' Stop listening, fail outstanding requests, close client
+            connections and shut the pool. '''
+        if self._server is not None:
+            self._server.close()
+        work = [task for task in [self._batcher] + list(self._tasks)
+                if task is not None]
+        for task in work:
+            task.cancel()
+        await asyncio.gather(*work, return_exceptions=True)
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError('Service closed.'))
+        self._pending.clear()
+
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    async def solve(self, cards):
+        ''' Return the sets on a board as tuples of positions, in the order
+            find_all_sets gives them. Cards are in any form BoardReader
+            reads. '''
+        start = perf_counter()
+        self.requests += 1
+        indices = [self._reader.card_index(card) for card in cards]
+        order = sorted(range(len(indices)), key=indices.__getitem__)
+        key = tuple(indices[position] for position in order)
+
+        future = self._pending.get(key)
+        if future is None:
+            future = self._pending[key] = asyncio.get_running_loop(
+                ).create_future()
+            self._queue.put_nowait(key)
+            self.max_queue_depth = max(self.max_queue_depth,
+                                       self._queue.qsize())
+        else:
+            self.deduplicated += 1
+        # shield, so one caller going away does not cancel the board for
+        # the others waiting on it.
+        sets = await asyncio.shield(future)
+
+        # Map positions on the sorted board back onto the caller's order.
+        hands = sorted(tuple(sorted(order[position] for position in a_set))
+                       for a_set in sets)
+        self._latencies.append(perf_counter() - start)
+        return hands
+
+    def metrics(self):
+        ''' Return a dict of counters, the current queue depth and batches
+            solving, and request latency percentiles in seconds over the
+            latency window. '''
+        latencies = sorted(self._latencies)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1,
+                                 int(fraction * len(latencies)))]
+
+        return {'requests': self.requests,
+                'deduplicated': self.deduplicated,
+                'boards_solved': self.boards_solved,
+                'batches': self.batches,
+                'queue_depth': self._queue.qsize() if self._queue else 0,
+                'max_queue_depth': self.max_queue_depth,
+                'batches_solving': len(self._tasks),
+                'latency_p50': percentile(0.5),
+                'latency_p99': percentile(0.99)}
+
+    async def _gather_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(),
+                                                        timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._in_flight.acquire()
+            task = asyncio.ensure_future(self._solve_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _solve_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            if self.workers == 0:
+                results = await loop.run_in_executor(
+                    self._executor, _solve_boards, batch, self.solver)
+            else:
+                results = await loop.run_in_executor(self._executor,
+                                                     _solve_boards, batch)
+        except Exception as error:
+            # Hand the failure to everyone waiting on these boards.
+            for key in batch:
+                self._pending.pop(key).set_exception(error)
+            return
+        finally:
+            self._in_flight.release()
+        self.batches += 1
+        self.boards_solved += len(batch)
+        for key, sets in zip(batch, results):
+            self._pending.pop(key).set_result(sets)
+
+    async def _serve(self, reader, writer):
+        ''' Answer one client's requests, each as soon as it is solved. '''
+        answers = set()
+        connection = asyncio.current_task()
+        self._connections[connection] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                answer = asyncio.ensure_future(self._answer(line, writer))
+                answers.add(answer)
+                answer.add_done_callback(answers.discard)
+            await asyncio.gather(*answers)
+        finally:
+            del self._connections[connection]
+            writer.close()
+
+    async def _answer(self, line, writer):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('Requests must be JSON objects.')
+            request_id = request.get('id')
+            if request.get('metrics'):
+                response = {'id': request_id, 'metrics': self.metrics()}
+            else:
+                sets = await self.solve(request['cards'])
+                response = {'id': request_id, 'sets': sets}
+        except Exception as error:
+            # Any failure, a bad board or a broken pool, is answered, so the
+            # client is never left waiting.
+            response = {'id': request_id,
+                        'error': '{}: {}'.format(type(error).__name__, error)}
+        if writer.is_closing():
+            return
+        writer.write(json.dumps(response).encode() + b'\n')
+        await writer.drain()
+
+
+class SetClient(object):
+    ''' Client for a SetService, matching answers to requests by id so many
+        requests can share one connection. Make one with connect(). '''
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._next_id = 0
+        self._waiting = dict()
+        self._listener = asyncio.ensure_future(self._listen())
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=None, path=None):
+        if path:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def solve(self, cards):
+        ''' Return the sets on a board as lists of positions. '''
+        response = await self._request({'cards': cards})
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response['sets']
+
+    async def metrics(self):
+        return (await self._request({'metrics': True}))['metrics']
+
+    async def close(self):
+        self._listener.cancel()
+        self._writer.close()
+        await asyncio.gather(self._listener, return_exceptions=True)
+
+    async def _request(self, request):
+        self._next_id += 1
+        request['id'] = self._next_id
+        future = self._waiting[self._next_id] = asyncio.get_running_loop(
+            ).create_future()
+        self._writer.write(json.dumps(request).encode() + b'\n')
+        await self._writer.drain()
+        return await future
+
+    async def _listen(self):
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            self._waiting.pop(response['id']).set_result(response)
+        for future in self._waiting.values():
+            future.set_exception(ConnectionError('Service closed.'))
+
+
+def _solve_boards(boards, solver=None):
+    # Workers keep the solver _init_worker made in solve_boards.
+    solver = solver or solve_boards._worker_solver
+    return [solve_board(solver, board) for board in boards]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve set solving.')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='three',
+                        help='preset attributes of the deck')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='UNIX socket path, in place of TCP')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='solver processes, default one per CPU')
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--batch-delay', type=float, default=0.002)
+    args = parser.parse_args()
+
+    async def serve():
+        service = SetService(PRESETS[args.preset], args.workers,
+                             args.max_batch, args.batch_delay)
+        await service.start(args.host, args.port, args.unix)
+        print('Serving on {}'.format(service.address))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# usr/bin/env python
+
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from play_set import three_hand, four_hand
+from set_service import SetClient, SetService
+from set_solver import SetSolver
+
+
+class TestSetService(unittest.IsolatedAsyncioTestCase):
+
+    async def start(self, attributes, workers=0, **options):
+        service = SetService(attributes, workers=workers, **options)
+        await service.start()
+        self.addAsyncCleanup(service.close)
+        return service
+
+    async def test_solve(self):
+        ''' Answers should give the same sets as find_all_sets, as
+            positions on the caller's board. '''
+        service = await self.start(four_hand)
+        solver = SetSolver(four_hand)
+        boards = [solver.deal_game(20) for _ in range(10)]
+        results = await asyncio.gather(*[
+            service.solve([[card.attributes[attribute]
+                            for attribute in four_hand] for card in board])
+            for board in boards])
+        for board, sets in zip(boards, results):
+            self.assertEqual([tuple(board[position] for position in a_set)
+                              for a_set in sets],
+                             solver.find_all_sets(board))
+
+    async def test_duplicates_in_flight(self):
+        ''' The same cards asked for together, in any order, should be
+            solved once and answered in each caller's order. '''
+        service = await self.start(three_hand, batch_delay=0.05)
+        solver = SetSolver(three_hand)
+        board = list(range(0, 81, 3))
+        orders = [random.sample(board, len(board)) for _ in range(8)]
+        results = await asyncio.gather(*[service.solve(order)
+                                         for order in orders])
+
+        metrics = service.metrics()
+        self.assertEqual(metrics['boards_solved'], 1)
+        self.assertEqual(metrics['deduplicated'], 7)
+        self.assertEqual(metrics['batches'], 1)
+        self.assertEqual(metrics['requests'], 8)
+        for order, sets in zip(orders, results):
+            cards = [solver.compact_card(index) for index in order]
+            self.assertEqual([tuple(cards[position] for position in a_set)
+                              for a_set in sets],
+                             solver.find_all_sets(cards))
+
+    async def test_batches(self):
+        ''' Different boards arriving together should share batches of at
+            most max_batch boards. '''
+        service = await self.start(three_hand, batch_delay=0.05, max_batch=4)
+        await asyncio.gather(*[service.solve([index, index + 1])
+                               for index in range(0, 20, 2)])
+        metrics = service.metrics()
+        self.assertEqual(metrics['boards_solved'], 10)
+        self.assertEqual(metrics['batches'], 3)
+        self.assertEqual(metrics['max_queue_depth'], 10)
+        self.assertLessEqual(metrics['latency_p50'], metrics['latency_p99'])
+
+    async def test_over_sockets(self):
+        ''' Clients should be served over TCP and UNIX sockets, get
+            metrics, and get errors back for bad boards. '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'sets.sock')
+        unix_service = SetService(three_hand, workers=0)
+        await unix_service.start(path=path)
+        self.addAsyncCleanup(unix_service.close)
+        tcp_service = await self.start(three_hand, workers=1)
+
+        for client in (await SetClient.connect(path=path),
+                       await SetClient.connect(*tcp_service.address)):
+            self.addAsyncCleanup(client.close)
+            answers = await asyncio.gather(client.solve([0, 1, 2, 3]),
+                                           client.solve([0, 4]))
+            self.assertEqual(answers, [[[0, 1, 2]], []])
+            self.assertEqual((await client.metrics())['requests'], 2)
+            with self.assertRaises(ValueError):
+                await client.solve([81])
+
+    async def test_failed_batch(self):
+        ''' A batch that fails should get error replies, and leave the
+            connection serving. '''
+        service = await self.start(three_hand)
+        client = await SetClient.connect(*service.address)
+        self.addAsyncCleanup(client.close)
+        with mock.patch('set_service._solve_boards',
+                        side_effect=RuntimeError('pool broke')):
+            results = await asyncio.wait_for(asyncio.gather(
+                client.solve([0, 1, 2]), client.solve([3, 4, 5]),
+                return_exceptions=True), 10)
+        for result in results:
+            self.assertIsInstance(result, ValueError)
+            self.assertIn('RuntimeError: pool broke', str(result))
+        self.assertEqual(await client.solve([0, 1, 2]), [[0, 1, 2]])
+
+
+if __name__ == '__main__':
+    unittest.main()
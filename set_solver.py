@@ -1,7 +1,25 @@
 # usr/bin/env python
 
+import json
+import mmap
+import os
 import random
-from itertools import combinations
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from itertools import (chain, combinations, combinations_with_replacement,
+                       groupby, product)
+from math import comb
+from numbers import Integral
+from operator import add
+from time import perf_counter
+
+# cProfile, pstats, tracemalloc, concurrent.futures and numpy are slow to
+# import and only some callers need them, so they are imported where used.
 
 
 ATTRIBS = {'colors': ['red', 'blue', 'yellow'],
@@ -11,77 +29,998 @@ ATTRIBS = {'colors': ['red', 'blue', 'yellow'],
 
 
 class Deck(object):
-    '''Stateful representation of a Set deck.'''
-    def __init__(self, size=81, attribs=ATTRIBS, shuffle=True):
-        self.size = size
+    '''Stateful representation of a Set deck: one card for every
+       combination of variations in attribs, dealt from the top.
+       :param size: number of cards to keep, default the whole deck.
+       :param seed: seed for a reproducible shuffle.'''
+    def __init__(self, size=None, attribs=ATTRIBS, shuffle=True, seed=None):
         self.attribs = attribs
         self.cards = self._make_deck()
         if shuffle:
-            random.shuffle(self.cards)
-        else:
-            pass
+            if seed is None:
+                random.shuffle(self.cards)
+            else:
+                random.Random(seed).shuffle(self.cards)
+        if size is not None:
+            del self.cards[size:]
+        self.size = len(self.cards)
+        # Dealing moves this marker rather than slicing the list each time.
+        self._top = 0
+
+    def __len__(self):
+        return len(self.cards) - self._top
 
     def _make_deck(self):
-        return []
+        attributes = list(self.attribs)
+        return [Card._from_variants(dict(zip(attributes, variations)))
+                for variations in product(*self.attribs.values())]
 
     def deal(self, num_cards=3):
-        "Returns a list of num_cards cards."
-        try:
-            ret = self.cards[0:num_cards]
-            self.cards = self.cards[num_cards:]
-            return ret
-        except:
-            raise "empty"
+        "Returns a list of up to num_cards cards from the top of the deck."
+        if self._top >= len(self.cards):
+            raise IndexError('Deck is empty.')
+        ret = self.cards[self._top:self._top + num_cards]
+        self._top += len(ret)
+        return ret
 
-    def size(self):
-        return len(self.cards)
 
 class Game(object):
     '''Class to represent a game of Set, comprising a deck and
        a number of dealt cards.'''
-    def __init__(self, num_cards=12, deck=None):
+    def __init__(self, num_cards=12, deck=None, solver=None):
         if deck == None:
             self.deck = Deck()
         else:
             self.deck = deck
-        self.visible = self.deck.deal(numcards)
+        if solver == None:
+            self.solver = SetSolver(self.deck.attribs)
+        else:
+            self.solver = solver
+        self.visible = self.deck.deal(num_cards)
         self.num_cards = num_cards
+        # Sets among the visible cards, kept current as cards come and go.
+        self.index = BoardIndex(self.solver, self.visible)
+
+    def sets(self):
+        ''' Return the sets among the visible cards. '''
+        return self.index.sets()
 
     def check(self, pset):
-        if is_valid(pset):
+        pset = list(pset)
+        if len(pset) != self.solver._hand_size or len(
+                set(map(id, pset))) != len(pset):
+            # A card taken twice can score as a set, but can't be taken.
+            return False
+        if (all(card in self.index for card in pset)
+                and self.solver.check_for_set(pset)):
             # remove the cards in pset from the visible state,
             # and deal three cards from the deck to the visible state
+            # unless extra cards were already dealt
             for card in pset:
                 self.visible.remove(card)
-            if self.deck.size() > 2:
-                self.visible.append(self.deck.deal(3))
-            else:
-                print "Deck is empty."
+                self.index.remove(card)
+            if len(self.visible) < self.num_cards and len(self.deck):
+                self._deal(len(pset))
             return True
         else:
             # don't do anything if the proposed set is not valid
             return False
 
+    def deal_more(self):
+        ''' Deal one more hand's worth of cards, as when no set is visible.
+            Returns False if the deck is empty. '''
+        if not len(self.deck):
+            return False
+        self._deal(self.solver._hand_size)
+        return True
+
+    def _deal(self, num_cards):
+        dealt = self.deck.deal(num_cards)
+        self.visible.extend(dealt)
+        for card in dealt:
+            self.index.add(card)
+
+
+def simulate_game(seed=None, attributes=ATTRIBS, num_cards=12, choose=None,
+                  solver=None):
+    ''' Play a game of Set to exhaustion from a deck shuffled with seed.
+        Takes a set whenever one is visible and deals more cards when none
+        is, until the deck is empty and no set remains. choose picks which
+        of the visible sets, as tuples of deck indices, to take, defaulting
+        to the first found; pass a solver to reuse one across many games.
+        Returns the number of sets taken and the number of cards left on
+        the table. The game is played as Game plays it, on the deck Deck
+        shuffles with seed, but over deck indices and a BitBoard, so no
+        Cards are made. '''
+    if solver is None:
+        solver = SetSolver(attributes)
+    # Deck shuffles its cards in deck index order, so shuffling the indices
+    # the same way deals the same cards.
+    deck = list(range(solver.deck_size))
+    if seed is None:
+        random.shuffle(deck)
+    else:
+        random.Random(seed).shuffle(deck)
+    board = BitBoard(solver, deck[:num_cards])
+    top = num_cards
+
+    sets_taken = 0
+    while True:
+        if choose is None:
+            first = next(solver._iter_completions(board), None)
+            pset = first and first[0] + (first[1][0],)
+        else:
+            sets = [prefix + (last,) for prefix, lasts
+                    in solver._iter_completions(board) for last in lasts]
+            pset = sets and choose(sets)
+        if pset:
+            board.difference_update(pset)
+            sets_taken += 1
+            if len(board) < num_cards and top < len(deck):
+                board.update(deck[top:top + len(pset)])
+                top += len(pset)
+        elif top < len(deck):
+            board.update(deck[top:top + solver._hand_size])
+            top += solver._hand_size
+        else:
+            break
+    return sets_taken, len(board)
+
+
+def solve_many(attributes, board_size, n_boards, seed=0, workers=None,
+               chunk_size=1000, table=None):
+    ''' Deal n_boards random boards of board_size different cards and count
+        the sets on each, across a pool of workers processes (default one
+        per CPU). Boards are dealt in chunks of chunk_size, each from its own
+        seed made from seed and the chunk's place, so results depend on
+        seed and chunk_size but never on workers. Only seeds and counts
+        cross between processes. Pass the path of a saved SetTable as table
+        to have every worker map it and look sets up there. Returns a dict
+        mapping a number of sets to how many boards had that many. '''
+    chunks = [(attributes, board_size, min(chunk_size, n_boards - start),
+               '{}:{}'.format(seed, start), table)
+              for start in range(0, n_boards, chunk_size)]
+
+    histogram = Counter()
+    if workers == 1 or len(chunks) < 2:
+        for chunk in chunks:
+            histogram.update(_solve_chunk(*chunk))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(workers) as pool:
+            for counts in pool.map(_solve_chunk, *zip(*chunks)):
+                histogram.update(counts)
+    return dict(sorted(histogram.items()))
+
+
+def _solve_chunk(attributes, board_size, n_boards, seed, table=None):
+    ''' Deal and solve one chunk of boards for solve_many, drawing cards as
+        indices into the deck and solving them as BitBoards, so no Cards
+        are made. '''
+    solver = SetSolver(attributes)
+    if table:
+        solver.use_table(table)
+    deck = range(solver.deck_size)
+    rng = random.Random(seed)
+    counts = Counter()
+    for _ in range(n_boards):
+        board = BitBoard(solver, rng.sample(deck, board_size))
+        counts[sum(len(lasts) for _, lasts
+                   in solver._iter_completions(board))] += 1
+    return counts
+
+
+def _import_numpy():
+    ''' Import numpy on first use, or return None if it is not installed. '''
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _hand_chunks(numpy, num_cards, hand_size, chunk_size):
+    ''' Generate every hand of hand_size positions out of num_cards, in the
+        order combinations() gives them, as (hands, hand_size) numpy arrays
+        of at most chunk_size rows, built without a Python loop per hand.
+
+        Hands are grouped by their first prefix_size positions, with the
+        prefix just long enough that no group outgrows half a chunk. Runs of
+        whole groups make up each chunk, and are filled out a column at a
+        time: each row is repeated once per value its next column can take,
+        from one past its last value to the most that still leaves room for
+        the columns after it. '''
+    if hand_size > num_cards:
+        return
+    half = max(chunk_size // 2, 1)
+    prefix_size = 0
+    while (prefix_size < hand_size
+           and comb(num_cards - prefix_size, hand_size - prefix_size) > half):
+        prefix_size += 1
+    prefixes = numpy.zeros((1, 0), dtype=numpy.intp)
+    for column in range(prefix_size):
+        prefixes = _extend_hands(numpy, prefixes, num_cards, hand_size,
+                                 column)
+
+    # Hands in each prefix's group, by its last position.
+    rest = hand_size - prefix_size
+    if prefix_size:
+        group_sizes = numpy.array([comb(num_cards - 1 - last, rest)
+                                   for last in range(num_cards)],
+                                  dtype=numpy.int64)[prefixes[:, -1]]
+    else:
+        group_sizes = numpy.array([comb(num_cards, rest)], dtype=numpy.int64)
+    # Groups ending in the same stretch of half a chunk go together, so a
+    # chunk holds less than two halves.
+    chunk_numbers = (numpy.cumsum(group_sizes) - 1) // half
+    starts = numpy.flatnonzero(numpy.diff(chunk_numbers)) + 1
+    for group in numpy.split(prefixes, starts):
+        for column in range(prefix_size, hand_size):
+            group = _extend_hands(numpy, group, num_cards, hand_size, column)
+        yield group
+
+
+def _extend_hands(numpy, hands, num_cards, hand_size, column):
+    ''' Add column to hands, a (hands, column) array, giving a row for each
+        value it can take, in order. '''
+    if column:
+        first = hands[:, -1] + 1
+    else:
+        first = numpy.zeros(len(hands), dtype=numpy.intp)
+    counts = numpy.maximum(num_cards - hand_size + column + 1 - first, 0)
+    rows = numpy.repeat(numpy.arange(len(hands)), counts)
+    # Each new row's place among the rows made from the same hand.
+    offsets = numpy.arange(len(rows)) - numpy.repeat(
+        numpy.cumsum(counts) - counts, counts)
+    return numpy.column_stack((hands[rows], first[rows] + offsets))
+
+
+def _free_threading():
+    ''' Return whether threads run Python code in parallel, as they do only
+        on free-threaded builds with the GIL left off. '''
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+class _Deadline(object):
+    ''' Count a search's nodes, raising _OutOfTime from tick once
+        max_seconds have passed. The clock is only read every 4096 nodes,
+        to keep it off the search's hot path. '''
+    def __init__(self, max_seconds=None):
+        self.nodes = 0
+        self._end = None
+        if max_seconds is not None:
+            self._end = perf_counter() + max_seconds
+
+    def tick(self):
+        self.nodes += 1
+        if self._end is not None and self.nodes % 4096 == 1:
+            if perf_counter() > self._end:
+                raise _OutOfTime()
+
+
+def _save_json(path, value):
+    ''' Write value to path as JSON. Write then rename, so a crash never
+        leaves half a file. '''
+    with open(path + '.tmp', 'w') as json_file:
+        json.dump(value, json_file)
+    os.replace(path + '.tmp', path)
+
+
+def _group_contents(rows, group, columns):
+    ''' Return the sorted variations of a group of rows on columns. '''
+    return tuple(sorted(tuple(rows[row][column] for column in columns)
+                        for row in group))
+
+
+def _tied_contents(rows, groups, columns):
+    ''' Return what groups of rows hold on columns, each column's
+        variations relabelled by how many rows of each group have them, so
+        groups differing only in the labels of columns still to place give
+        the same contents. '''
+    relabel = []
+    for column in columns:
+        counts = defaultdict(lambda: [0] * len(groups))
+        for number, group in enumerate(groups):
+            for row in group:
+                counts[rows[row][column]][number] -= 1
+        relabel.append({digit: label for label, digit in enumerate(
+            sorted(counts, key=lambda digit: (counts[digit], digit)))})
+    return tuple(tuple(sorted(tuple(labels[rows[row][column]]
+                                    for labels, column
+                                    in zip(relabel, columns))
+                              for row in group))
+                 for group in groups)
+
+
+def _distinct_orders(items, key):
+    ''' Generate the orders of items that differ in their sequence of key
+        values, items with equal keys keeping their given order. '''
+    kinds = []
+    by_key = dict()
+    for item in items:
+        kind = by_key.get(key(item))
+        if kind is None:
+            kind = by_key[key(item)] = []
+            kinds.append(kind)
+        kind.append(item)
+    taken = [0] * len(kinds)
+    order = []
+
+    def extend():
+        if len(order) == len(items):
+            yield tuple(order)
+            return
+        for number, kind in enumerate(kinds):
+            if taken[number] < len(kind):
+                order.append(kind[taken[number]])
+                taken[number] += 1
+                yield from extend()
+                taken[number] -= 1
+                order.pop()
+    return extend()
+
+
+def _pack_digits(digits):
+    ''' Pack variant indices three bits apart, as BoardIndex._pack does. '''
+    packed = 0
+    for digit in digits:
+        packed = (packed << 3) | digit
+    return packed
+
+
+# Compiled schemas by attributes, shared by every SetSolver whose attributes
+# have the same variations in the same order. See SetSolver._compile_schema.
+_compiled_schemas = dict()
+
+
+class BoardIndex(object):
+    ''' Keeps the sets among a changing board of cards up to date. Adding a
+        card only searches for the sets that include it, and removing a card
+        drops the sets it was part of, so neither rescans the whole board.
+        Cards key the index, so each card may only be on the board once.
+        :param solver: the SetSolver whose attributes the cards share.
+        :param cards: iterable of cards to start the board with. '''
+    def __init__(self, solver, cards=()):
+        self.solver = solver
+        # Cards in the order they were added, mapped to their variant indices
+        # and attribute weights; a running count orders cards added later
+        # after earlier ones.
+        self._digits = dict()
+        self._weights = dict()
+        self._packed = dict()
+        self._order = dict()
+        self._added = 0
+        # Cards on the board by variant indices, for completion lookups
+        self._by_digits = defaultdict(list)
+        # Three variant games only: third cards' variant indices by the sum
+        # of the other two cards' packed indices, filled in as pairs appear
+        self._thirds = dict()
+        # Current sets as tuples in board order, used as an ordered set
+        self._sets = dict()
+        self._card_sets = defaultdict(set)
+        for card in cards:
+            self.add(card)
+
+    def __len__(self):
+        return len(self._weights)
+
+    def __contains__(self, card):
+        return card in self._weights
+
+    def add(self, card):
+        ''' Put card on the board and record the sets it completes. '''
+        if card in self._weights:
+            raise ValueError('Card is already on the board.')
+
+        card_digits = self.solver._card_digits(card)
+        for a_set in self._new_sets(card, card_digits):
+            self._add_set(a_set)
+        self._digits[card] = card_digits
+        self._weights[card] = self.solver._digit_weights(card_digits)
+        self._packed[card] = self._pack(card_digits)
+        self._order[card] = self._added
+        self._added += 1
+        self._by_digits[card_digits].append(card)
+
+    def remove(self, card):
+        ''' Take card off the board, along with every set it was in. '''
+        card_digits = self._digits.pop(card)
+        del self._weights[card]
+        del self._packed[card]
+        del self._order[card]
+        self._by_digits[card_digits].remove(card)
+        if not self._by_digits[card_digits]:
+            del self._by_digits[card_digits]
+        for a_set in self._card_sets.pop(card, ()):
+            del self._sets[a_set]
+            for other in a_set:
+                if other is not card:
+                    self._card_sets[other].discard(a_set)
+        return
+
+    def sets(self):
+        ''' Return the current sets, oldest first. '''
+        return list(self._sets)
+
+    def has_set(self):
+        ''' Check whether the board holds any set. '''
+        return bool(self._sets)
+
+    def _new_sets(self, card, card_digits):
+        ''' Generate the sets that card makes with cards on the board. This is
+            the solver's pruned search with card fixed in every hand, run
+            against the index's own lookups instead of a fresh board. '''
+        solver = self.solver
+        order = self._order
+        by_digits = self._by_digits
+        if solver._standard and solver._hand_size == 3:
+            # Each card on the board pairs with card to name the third. The
+            # third only depends on the pair's variant sums, which adding the
+            # packed indices gives in one step, so remember it by that sum.
+            thirds = self._thirds
+            packed = self._pack(card_digits)
+            for other, other_packed in self._packed.items():
+                pair_sum = packed + other_packed
+                third_digits = thirds.get(pair_sum)
+                if third_digits is None:
+                    third_digits = tuple(
+                        -(a + b) % 3 for a, b
+                        in zip(card_digits, self._digits[other]))
+                    thirds[pair_sum] = third_digits
+                for third in by_digits.get(third_digits, ()):
+                    if order[third] > order[other]:
+                        yield other, third, card
+            return
+        elif solver._hand_size < 3 or solver._completions is None:
+            board = list(self._digits)
+            for prefix, lasts in solver._iter_completions(
+                    list(self._digits.values()), fixed=(card_digits,)):
+                hand = tuple(board[position] for position in prefix)
+                for last in lasts:
+                    yield hand + (board[last], card)
+            return
+
+        partial_scores = solver._partial_scores
+        completions = solver._completions
+        last_depth = solver._hand_size - 1
+        board = list(self._weights.items())
+
+        def extend(hand, hand_scores, start):
+            # card is fixed in every hand, so hand is one deeper than it looks
+            depth = len(hand) + 1
+            feasible = partial_scores[depth + 1]
+            for position in range(start, len(board) - (last_depth - depth)):
+                other, weights = board[position]
+                scores = tuple(map(add, hand_scores, weights))
+                if not feasible.issuperset(scores):
+                    continue
+                elif depth + 1 < last_depth:
+                    yield from extend(hand + (other,), scores, position + 1)
+                    continue
+                last_digits = tuple(completions[score] for score in scores)
+                for last in by_digits.get(last_digits, ()):
+                    if order[last] > order[other]:
+                        yield hand + (other, last, card)
+
+        yield from extend((), solver._digit_weights(card_digits), 0)
+
+    def _pack(self, digits):
+        ''' Pack variant indices three bits apart. Three variant indices sum
+            to at most four, so packed cards add without carrying. '''
+        return _pack_digits(digits)
+
+    def _add_set(self, a_set):
+        self._sets[a_set] = None
+        for card in a_set:
+            self._card_sets[card].add(a_set)
+
+
+class BitBoard(object):
+    ''' A board as a bitset over deck indices, kept in a Python int whose
+        bit i is set while the deck's card i is on the board. Checking for a
+        card is one bit test, and adding or taking away cards, one or a
+        whole set at a time, is one mask update. SetSolver's searches take
+        a BitBoard as they take a list of cards, and give its sets as tuples
+        of deck indices. Each card can be on the board only once.
+        :param solver: the SetSolver whose deck the board is drawn from.
+        :param cards: cards to start with, as deck indices, Cards or
+        CompactCards.
+        :param mask: or the bitset to start with. '''
+    __slots__ = ('solver', 'mask')
+
+    def __init__(self, solver, cards=(), mask=0):
+        self.solver = solver
+        self.mask = mask | self._mask(cards)
+
+    def __repr__(self):
+        return '< BitBoard: {} cards >'.format(len(self))
+
+    def __len__(self):
+        return bin(self.mask).count('1')
+
+    def __contains__(self, card):
+        return bool(self.mask >> self.solver.deck_index(card) & 1)
+
+    def __iter__(self):
+        ''' Generate the deck indices on the board, in ascending order. '''
+        mask = self.mask
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def __eq__(self, other):
+        if not isinstance(other, BitBoard):
+            return NotImplemented
+        return self.mask == other.mask
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    # Boards change, so like sets they cannot be hashed.
+    __hash__ = None
+
+    def __or__(self, other):
+        return BitBoard(self.solver, mask=self.mask | other.mask)
+
+    def __and__(self, other):
+        return BitBoard(self.solver, mask=self.mask & other.mask)
+
+    def __sub__(self, other):
+        return BitBoard(self.solver, mask=self.mask & ~other.mask)
+
+    def __xor__(self, other):
+        return BitBoard(self.solver, mask=self.mask ^ other.mask)
+
+    def copy(self):
+        return BitBoard(self.solver, mask=self.mask)
+
+    def add(self, card):
+        self.mask |= 1 << self.solver.deck_index(card)
+
+    def remove(self, card):
+        ''' Take card off the board, raising KeyError if it is not on. '''
+        bit = 1 << self.solver.deck_index(card)
+        if not self.mask & bit:
+            raise KeyError(card)
+        self.mask ^= bit
+
+    def discard(self, card):
+        self.mask &= ~(1 << self.solver.deck_index(card))
+
+    def update(self, cards):
+        ''' Put cards on the board, as when dealing. '''
+        self.mask |= self._mask(cards)
+
+    def difference_update(self, cards):
+        ''' Take cards off the board, as when a set is found. '''
+        self.mask &= ~self._mask(cards)
+
+    def cards(self):
+        ''' Return the board's cards as CompactCards, in deck order. '''
+        return [self.solver.compact_card(index) for index in self]
+
+    def to_array(self):
+        ''' Return the board as a numpy bool array over the deck. '''
+        numpy = _import_numpy()
+        if numpy is None:
+            raise ImportError('BitBoard.to_array requires numpy.')
+        flags = numpy.zeros(self.solver.deck_size, dtype=bool)
+        flags[list(self)] = True
+        return flags
+
+    @classmethod
+    def from_array(cls, solver, flags):
+        ''' Make a board from a bool array over the deck. '''
+        return cls(solver, (int(index) for index in flags.nonzero()[0]))
+
+    def _mask(self, cards):
+        mask = 0
+        for card in cards:
+            mask |= 1 << self.solver.deck_index(card)
+        return mask
+
+
+class BoardTransform(object):
+    ''' A symmetry of the deck that keeps sets sets, as made by
+        SetSolver.canonical_board: its attributes reordered, and each
+        attribute's variations relabelled. columns[slot] is the attribute
+        whose variations move to slot, and labels[slot] maps each of them,
+        by variant index, to its new variant index. '''
+    __slots__ = ('solver', 'columns', 'labels', '_inverse')
+
+    def __init__(self, solver, columns, labels):
+        self.solver = solver
+        self.columns = tuple(columns)
+        self.labels = tuple(tuple(slot_labels) for slot_labels in labels)
+        self._inverse = tuple(
+            tuple(sorted(range(len(slot_labels)),
+                         key=slot_labels.__getitem__))
+            for slot_labels in self.labels)
+
+    def __repr__(self):
+        return '< BoardTransform: columns {}; labels {} >'.format(
+            self.columns, self.labels)
+
+    def apply(self, index):
+        ''' Return the deck index the card at index maps to. '''
+        digits = self.solver._index_to_digits(index)
+        return self.solver._digits_to_index(
+            [slot_labels[digits[column]] for column, slot_labels
+             in zip(self.columns, self.labels)])
+
+    def invert(self, index):
+        ''' Return the deck index that maps to the card at index. '''
+        digits = self.solver._index_to_digits(index)
+        original = [0] * len(digits)
+        for column, inverse, digit in zip(self.columns, self._inverse,
+                                          digits):
+            original[column] = inverse[digit]
+        return self.solver._digits_to_index(original)
+
+
+class SetCache(object):
+    ''' Least recently used cache in front of SetSolver.find_all_sets, for
+        boards that come up again and again. Boards are keyed by their cards'
+        deck indices, sorted, so the same cards in any order share an entry,
+        and a repeat board costs only working out that key and mapping the
+        cached sets back onto the caller's cards and order.
+        :param solver: the SetSolver whose attributes the cards share.
+        :param maxsize: most boards to keep; the least recently used board is
+        dropped to make room.
+        :param canonical: key boards by SetSolver.canonical_board instead,
+        so every board equivalent under the deck's symmetries shares an
+        entry. Working out the key costs more, so this pays when boards are
+        slow to solve or their symmetric copies come up often. '''
+    def __init__(self, solver, maxsize=1024, canonical=False):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1.')
+        self.solver = solver
+        self.canonical = canonical
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # Sets of each board as position tuples into its sorted cards, oldest
+        # use first
+        self._boards = OrderedDict()
+
+    def __len__(self):
+        return len(self._boards)
+
+    def find_all_sets(self, cards):
+        ''' Return the sets in cards, as SetSolver.find_all_sets would, from
+            the cache when the same cards have been solved before. '''
+        cards = list(cards)
+        key, order = self._fingerprint(cards)
+        sets = self._boards.get(key)
+        if sets is None:
+            self.misses += 1
+            digits = [self.solver._index_to_digits(index) for index in key]
+            sets = tuple(prefix + (last,) for prefix, lasts
+                         in self.solver._search('find_all_sets', digits)
+                         for last in lasts)
+            self._boards[key] = sets
+            if len(self._boards) > self.maxsize:
+                self._boards.popitem(last=False)
+        else:
+            self.hits += 1
+            self._boards.move_to_end(key)
+
+        # Sorting each set's positions, then the sets, gives the order
+        # combinations() would over the caller's cards.
+        hands = sorted(tuple(sorted(order[position] for position in a_set))
+                       for a_set in sets)
+        return [tuple(cards[position] for position in hand) for hand in hands]
+
+    def invalidate(self, cards=None):
+        ''' Drop the cached sets for cards, or every board if cards is None.
+            Returns whether anything was dropped. '''
+        if cards is None:
+            dropped = bool(self._boards)
+            self._boards.clear()
+            return dropped
+        key, _ = self._fingerprint(list(cards))
+        return self._boards.pop(key, None) is not None
+
+    def _fingerprint(self, cards):
+        ''' Return the sorted deck indices of cards, and the position in
+            cards of each index in that order. '''
+        solver = self.solver
+        indices = [solver.deck_index(card) for card in cards]
+        if self.canonical:
+            # The transform maps every card onto the canonical board, and
+            # sets onto sets, so cached positions still map back.
+            _, transform = solver.canonical_board(indices)
+            indices = [transform.apply(index) for index in indices]
+        order = sorted(range(len(indices)), key=indices.__getitem__)
+        return tuple(indices[position] for position in order), order
+
+
+class SetTable(object):
+    ''' Whole-deck table of set completions. For every ordered run of
+        hand_size - 1 cards, given as deck indices, it holds the index of
+        the one card that makes them a set, so solving a board is a lookup
+        per run. The table is kept as a flat array of deck_size **
+        (hand_size - 1) entries, the runs' indices read as base deck_size
+        numbers.
+
+        Pass path to keep the table on disk: a missing file is built and
+        saved, and an existing one is memory mapped read-only instead of
+        rebuilt, so processes loading the same file share its pages.
+        :param solver: the SetSolver whose deck the table covers.
+        :param path: optional file to load the table from or save it to.
+        :param max_entries: refuse decks whose table would be larger. '''
+    _MAGIC = b'SETTABLE'
+    _HEADER = struct.Struct('<8sBBBc')
+
+    def __init__(self, solver, path=None, max_entries=pow(2, 25)):
+        hand_size = solver._hand_size
+        if hand_size < 3:
+            raise ValueError('Every pair is a set with fewer than three '
+                             'variations.')
+        elif not solver._standard:
+            raise ValueError('Tables only cover the usual rules.')
+        self.solver = solver
+        self.path = path
+        self.deck_size = solver.deck_size
+        self.run_size = hand_size - 1
+        self.entries = pow(self.deck_size, self.run_size)
+        if self.entries > max_entries:
+            raise ValueError('A table of {} entries is too large.'.format(
+                self.entries))
+        # Entries fit in two bytes for all but the largest decks; the last
+        # value of the type marks runs that no card completes.
+        self.typecode = 'H' if self.deck_size < 0xFFFF else 'I'
+        self.missing = pow(256, array(self.typecode).itemsize) - 1
+
+        self._mmap = None
+        if path and os.path.exists(path):
+            self.table = self._load(path)
+        else:
+            self.table = self._build()
+            if path:
+                self._save(path)
+
+    def __len__(self):
+        return len(self.table)
+
+    def completion(self, indices):
+        ''' Return the deck index of the card that makes a set with the
+            cards at indices, or None if no card does. '''
+        key = 0
+        for index in indices:
+            key = key * self.deck_size + index
+        last = self.table[key]
+        return None if last == self.missing else last
+
+    def close(self):
+        ''' Release a memory mapped table. '''
+        if self._mmap is not None:
+            self.table.release()
+            self._mmap.close()
+            self._mmap = None
+
+    def _iter_completions(self, digits, stats=None):
+        ''' Search a board as SetSolver._iter_completions does, by looking up
+            the completion of every run of cards. '''
+        solver = self.solver
+        indices = [solver._digits_to_index(card_digits)
+                   for card_digits in digits]
+        positions = solver._index_positions(indices)
+        table = self.table
+        deck_size = self.deck_size
+        run_size = self.run_size
+
+        def extend(prefix, key, start):
+            for position in range(start, len(indices) - run_size
+                                  + len(prefix) + 1):
+                hand = prefix + (position,)
+                hand_key = key * deck_size + indices[position]
+                if len(hand) < run_size:
+                    yield from extend(hand, hand_key, position + 1)
+                    continue
+                if stats is not None:
+                    stats.hands_examined += 1
+                found = positions.get(table[hand_key])
+                if found:
+                    lasts = found[bisect_right(found, position):]
+                    if lasts:
+                        yield hand, lasts
+
+        return extend((), 0, 0)
+
+    def _build(self):
+        ''' Fill the table. The completing card depends on the run before
+            the last card only through each attribute's score, so each
+            distinct score tuple's row of completions over the last card is
+            worked out once and copied for every run sharing it. '''
+        solver = self.solver
+        hand_size = solver._hand_size
+        weights = [pow(hand_size, exp) for exp in range(hand_size)]
+        completions = solver._completions
+        # Any sum including this stays negative, marking a missing entry.
+        missing = -self.deck_size * hand_size
+
+        rows = {}
+        table = array(self.typecode)
+        for run in product(range(self.deck_size), repeat=self.run_size - 1):
+            scores = [0] * len(solver.attributes)
+            for index in run:
+                for attribute, digit in enumerate(
+                        solver._index_to_digits(index)):
+                    scores[attribute] += weights[digit]
+            scores = tuple(scores)
+            row = rows.get(scores)
+            if row is None:
+                row = [0]
+                for score in scores:
+                    digit_row = [completions.get(score + weight, missing)
+                                 for weight in weights]
+                    row = [high * hand_size + low for high in row
+                           for low in digit_row]
+                row = rows[scores] = array(
+                    self.typecode, [last if last >= 0 else self.missing
+                                    for last in row])
+            table.extend(row)
+        return table
+
+    def _save(self, path):
+        header = self._HEADER.pack(self._MAGIC, self.solver._hand_size,
+                                   len(self.solver.attributes),
+                                   sys.byteorder == 'little',
+                                   self.typecode.encode())
+        # Write then rename, so readers never map half a table. Each writer
+        # has its own temporary file, as workers sharing a path that is not
+        # there yet all build and save the same table; whichever rename
+        # lands last wins.
+        handle, temporary = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)),
+            prefix=os.path.basename(path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as table_file:
+                table_file.write(header)
+                self.table.tofile(table_file)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def _load(self, path):
+        with open(path, 'rb') as table_file:
+            self._mmap = mmap.mmap(table_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        header = self._HEADER.unpack_from(self._mmap)
+        expected = (self._MAGIC, self.solver._hand_size,
+                    len(self.solver.attributes), sys.byteorder == 'little',
+                    self.typecode.encode())
+        table = memoryview(self._mmap)[self._HEADER.size:]
+        if header != expected or len(table) != (
+                self.entries * array(self.typecode).itemsize):
+            table.release()
+            self._mmap.close()
+            raise ValueError('{} is not a table for this deck.'.format(path))
+        return table.cast(self.typecode)
+
+
+class SetRules(object):
+    ''' What makes a set: how many cards one holds, and which combinations
+        of each attribute's variations it may have. A rule is
+        'same_or_different', the usual all same or all different; 'same';
+        'different'; 'any', which ignores the attribute; or a function
+        taking the sorted variant indices of a hand's cards for one
+        attribute and returning whether they are allowed. A SetSolver
+        compiles its rules into lookup tables once, shared by every solver
+        with the same attributes and rules.
+        :param set_size: cards in a set, default one per variation.
+        :param rules: dict of attribute to rule, for attributes that do not
+        follow default.
+        :param default: rule for the other attributes. '''
+    NAMED = ('same_or_different', 'same', 'different', 'any')
+
+    def __init__(self, set_size=None, rules=None,
+                 default='same_or_different'):
+        if set_size is not None and set_size < 2:
+            raise ValueError('A set needs at least two cards.')
+        self.set_size = set_size
+        self.rules = dict(rules or {})
+        self.default = default
+        for rule in [default] + list(self.rules.values()):
+            if rule not in self.NAMED and not callable(rule):
+                raise ValueError('Unknown rule {!r}.'.format(rule))
+
+    def __repr__(self):
+        return '< SetRules: set size {}; {}; default {} >'.format(
+            self.set_size, self.rules, self.default)
+
+    def rule(self, attribute):
+        ''' Return the rule attribute follows. '''
+        return self.rules.get(attribute, self.default)
+
+    def hands(self, rule, variants, set_size):
+        ''' Generate the hands rule allows for one attribute of variants
+            variations, as sorted tuples of variant indices. '''
+        if callable(rule):
+            for hand in combinations_with_replacement(range(variants),
+                                                      set_size):
+                if rule(hand):
+                    yield hand
+            return
+        if rule in ('same', 'same_or_different'):
+            for digit in range(variants):
+                yield (digit,) * set_size
+        if rule in ('different', 'same_or_different'):
+            yield from combinations(range(variants), set_size)
+        elif rule == 'any':
+            yield from combinations_with_replacement(range(variants),
+                                                     set_size)
+
 
 class SetSolver(object):
     ''' Class that solves for number of sets in a hand of Set.
         :param attributes: is a dictionary of dictionaries of list, top level
         keyed to attributes like 'color' or 'number'. Attribute lists must
-        all be the same length. 'number' is a required attribute. '''
-    def __init__(self, attributes):
+        all be the same length.
+        :param rules: optional SetRules; by default a set is one card per
+        variation, each attribute all the same or all different. '''
+    # Built by _compile_schema on first use, so making a solver is cheap.
+    _COMPILED = frozenset(['schema', '_variant_index', '_weights',
+                           '_valid_scores', '_partial_scores', '_completions',
+                           '_place_completions', '_packed_cards',
+                           '_pair_thirds', '_tables'])
+
+    def __init__(self, attributes, rules=None):
         self.attributes = self._check_attributes(attributes)
-        self.schema = self.make_validation_schema(attributes)
+        self.rules = rules or SetRules()
+        unknown = set(self.rules.rules) - set(self.attributes)
+        if unknown:
+            raise ValueError('Rules for unknown attributes: {}'.format(
+                sorted(unknown, key=str)))
+        # Variations per attribute, and cards per set, which the rules may
+        # set apart from it.
+        self._variants = len(next(iter(self.attributes.values())))
+        self._hand_size = self.rules.set_size or self._variants
+        self._deck_size = pow(self._variants, len(self.attributes))
+        # The usual rules, which the three variant shortcuts and SetTable
+        # rely on.
+        self._standard = (self._hand_size == self._variants and all(
+            self.rules.rule(attribute) == 'same_or_different'
+            for attribute in self.attributes))
+        # Instrumentation hooks; None keeps the searches uninstrumented.
+        self._hooks = None
+        # Whole-deck completion table, once use_table has made one
+        self._table = None
         return
 
+    def __getattr__(self, name):
+        # Only called for attributes not yet set: compile on first use.
+        if name in SetSolver._COMPILED and 'attributes' in self.__dict__:
+            self._compile_schema()
+            return self.__dict__[name]
+        raise AttributeError(name)
+
+    @property
+    def deck_size(self):
+        ''' Cards in the whole deck, each deck index below it. '''
+        return self._deck_size
+
     def _check_attributes(self, attributes):
         ''' Ensure attributes is a dict of lists of equal length. '''
-        if not isinstance(attributes, dict):
+        if not isinstance(attributes, dict) or not attributes:
             raise TypeError('Pass a dictionary of lists of attributes')
 
-        possibilities = len(attributes['number'])
+        possibilities = None
         for types in attributes.values():
             if not isinstance(types, list):
                 raise TypeError('Attributes must be list.')
+            elif possibilities is None:
+                possibilities = len(types)
             elif not len(types) == possibilities:
                 raise TypeError('Attributes are not equal in number.')
 
@@ -98,10 +1037,13 @@ class SetSolver(object):
         # that calculated based on the number of possible variations
         # for each attribute: number_of_attribs ^ attrib_index
         schema = dict()
-        size_of_hand = len(attributes['number'])
+        variants = len(next(iter(attributes.values())))
+        set_size = self.rules.set_size or variants
+        base, scoring = self._rule_scoring(attributes, variants, set_size)
 
         for attribute, variations in attributes.items():
-            schema[attribute] = {variation: pow(size_of_hand, exponent)
+            multiplier = scoring[attribute][1]
+            schema[attribute] = {variation: multiplier * pow(base, exponent)
                                  for exponent, variation
                                  in enumerate(variations)}
 
@@ -109,46 +1051,821 @@ class SetSolver(object):
         # or all of the same kind. With the scoring
         # schema above for a 3 card game, the values for variations are
         # 1, 3, 9. Winning hands would have scores of 3, 9, 27, or 13--
-        # all 1s, 3s, 9s, or one of each--for each attribute. This can be
-        # generalized as a set of ints from size_of_hand ** 2 to
-        # size_of_hand ** (size_of_hand + 1), plus the sum of the score for
-        # each attribute.
-        schema['valid_scores'] = {pow(size_of_hand, exp)
-                                  for exp in range(1, size_of_hand + 1)}
-        schema['valid_scores'].add(sum(pow(size_of_hand, exp)
-                                       for exp in range(size_of_hand)))
+        # all 1s, 3s, 9s, or one of each--for each attribute. Other rules
+        # allow other hands, each scored the same way.
+        schema['valid_scores'] = set()
+        for rule, multiplier in set(scoring.values()):
+            if multiplier == 0:
+                # Attributes any hand is valid for weigh nothing.
+                schema['valid_scores'].add(0)
+                continue
+            schema['valid_scores'].update(
+                multiplier * sum(pow(base, digit) for digit in hand)
+                for hand in self.rules.hands(rule, variants, set_size))
 
         return schema
 
+    def _rule_scoring(self, attributes, variants, set_size):
+        ''' Return the base of the variation weights, and each attribute's
+            rule and weight multiplier. A hand's score counts how many of
+            its cards have each variation in base base digits, so it must
+            exceed set_size unless a digit can only fill up by every card
+            matching. Attributes with different rules get multipliers far
+            enough apart that their scores never meet, so one set of valid
+            scores serves them all; 'any' attributes get 0. '''
+        base = variants if set_size <= variants else set_size + 1
+        spacing = pow(base, variants + 1)
+        multipliers = dict()
+        scoring = dict()
+        for attribute in attributes:
+            rule = self.rules.rule(attribute)
+            if rule == 'any':
+                scoring[attribute] = (rule, 0)
+                continue
+            if rule not in multipliers:
+                multipliers[rule] = pow(spacing, len(multipliers))
+            scoring[attribute] = (rule, multipliers[rule])
+        return base, scoring
+
+    def _compile_schema(self):
+        ''' Build the schema and flatten it for the hot paths: a tuple of
+            weights per attribute, indexed by variant index and in attribute
+            order, and a frozenset of valid scores. A boolean array over the
+            score range would need hand_size ** hand_size entries, which is
+            too large for the bigger random games; frozenset membership is
+            just as quick. The results are shared with every solver of the
+            same attributes and rules, so should not be changed. '''
+        try:
+            key = (tuple((attribute, tuple(variations))
+                         for attribute, variations in self.attributes.items()),
+                   self._hand_size,
+                   tuple(self.rules.rule(attribute)
+                         for attribute in self.attributes))
+            compiled = _compiled_schemas.get(key)
+        except TypeError:
+            # Unhashable variations cannot key the cache; compile unshared.
+            key, compiled = None, None
+        if compiled is None:
+            compiled = self._build_compiled()
+            if key is not None:
+                _compiled_schemas[key] = compiled
+        self.__dict__.update(compiled)
+
+    def _build_compiled(self):
+        schema = self.make_validation_schema()
+        # _packed_cards and _pair_thirds fill in as BitBoard searches of
+        # three variant games meet cards and pairs.
+        compiled = {'schema': schema, '_tables': dict(),
+                    '_packed_cards': dict(), '_pair_thirds': dict()}
+        # Map each attribute's variations to their index in its list, so
+        # cards can be handled as tuples of ints rather than dicts of strings.
+        compiled['_variant_index'] = {attribute: {variation: index
+                                                  for index, variation
+                                                  in enumerate(variations)}
+                                      for attribute, variations
+                                      in self.attributes.items()}
+        compiled['_weights'] = tuple(tuple(schema[attribute][variation]
+                                           for variation in variations)
+                                     for attribute, variations
+                                     in self.attributes.items())
+        compiled['_valid_scores'] = frozenset(schema['valid_scores'])
+
+        # For pruned searches: the scores a partial hand of each size can
+        # have and still be completed, i.e. part of some valid hand, such as
+        # all one variation or all different so far. And one card short of
+        # a hand, the variations that finish each feasible score.
+        hand_size = self._hand_size
+        base, scoring = self._rule_scoring(self.attributes, self._variants,
+                                           hand_size)
+        partial_scores = {depth: set() for depth in range(1, hand_size)}
+        finishers = defaultdict(set)
+        for rule, multiplier in set(scoring.values()):
+            if multiplier == 0:
+                for scores in partial_scores.values():
+                    scores.add(0)
+                finishers[0].update(range(self._variants))
+                continue
+            for hand in self.rules.hands(rule, self._variants, hand_size):
+                weights = [multiplier * pow(base, digit) for digit in hand]
+                for depth, scores in partial_scores.items():
+                    scores.update(map(sum, combinations(weights, depth)))
+                for digit, weight in zip(hand, weights):
+                    finishers[sum(weights) - weight].add(digit)
+        compiled['_partial_scores'] = {depth: frozenset(scores) for
+                                       depth, scores in partial_scores.items()}
+
+        # Under the usual rules each feasible score needs exactly one
+        # variation to finish: the repeated one, or the one still missing,
+        # so the last card is looked up rather than searched for. Two
+        # variant games are the exception, where either finishes, as are
+        # rules like 'different' with fewer cards than variations; they
+        # get None.
+        compiled['_completions'] = None
+        compiled['_place_completions'] = None
+        if all(len(digits) == 1 for digits in finishers.values()):
+            completions = compiled['_completions'] = {
+                score: digits.pop() for score, digits in finishers.items()}
+            # For BitBoards: each attribute's completing variant index,
+            # already multiplied by its place in the deck index, so the
+            # places add up to the completing card's index.
+            compiled['_place_completions'] = tuple(
+                {score: digit * pow(self._variants, place)
+                 for score, digit in completions.items()}
+                for place in reversed(range(len(self.attributes))))
+        return compiled
+
+    def _card_weights(self, card):
+        ''' Return a card's score for each attribute, in attribute order. '''
+        return self._digit_weights(self._card_digits(card))
+
+    def _digit_weights(self, digits):
+        ''' Return the score for each attribute of a variant index tuple. '''
+        return tuple(weights[digit] for weights, digit
+                     in zip(self._weights, digits))
+
+    def _is_valid_hand(self, hand_weights):
+        ''' Check a hand given as per-card weight tuples. '''
+        valid_scores = self._valid_scores
+        for score in map(sum, zip(*hand_weights)):
+            if score not in valid_scores:
+                return False
+        return True
+
     def check_for_set(self, hand):
         ''' Check hand of cards to see if it is a set. '''
 
-        if not len(hand) == len(self.attributes['number']):
-            raise TypeError('Hand size must equal possible variations.')
+        if not len(hand) == self._hand_size:
+            raise TypeError('Hand size must equal the set size.')
 
-        # Loop through cards and build a score for each attribute, card by
-        # card. If by some mishap cards do not share the SetSolver's attributes
-        # here, a KeyError will be thrown.
-        hand_score = {attribute: 0 for attribute in self.attributes.keys()}
-        for card in hand:
-            for attribute in self.attributes.keys():
-                card_variation = card.attributes[attribute]
-                hand_score[attribute] += self.schema[attribute][card_variation]
+        # Score each attribute from the cards' variant indices, so Cards and
+        # CompactCards score alike. If by some mishap cards do not share the
+        # SetSolver's attributes here, a KeyError will be thrown.
+        return self._is_valid_hand([self._card_weights(card) for card in hand])
 
-        for score in hand_score.values():
-            if not score in self.schema['valid_scores']:
-                return False
-        else:
+    def find_all_sets(self, cards, threads=None):
+        ''' Given a number of cards, find all possible sets. Pass threads to
+            search a large board across that many threads on a free-threaded
+            build; with the GIL on, or for a BitBoard, the search runs in
+            this thread. The sets come out in the same order either way. '''
+        if threads is not None and threads < 1:
+            raise ValueError('threads must be at least 1.')
+        if (threads is None or threads == 1 or isinstance(cards, BitBoard)
+                or not _free_threading()):
+            return list(self._iter_sets(cards, 'find_all_sets'))
+        cards = list(cards)
+        return [tuple(cards[position] for position in hand) for hand
+                in self._threaded_search(self._encode_board(cards), threads)]
+
+    def iter_sets(self, cards):
+        ''' Generate the sets in cards one by one, in the same order as
+            find_all_sets. The search only runs as far as it is iterated. '''
+        return self._iter_sets(cards, 'iter_sets')
+
+    def _iter_sets(self, cards, method):
+        if isinstance(cards, BitBoard):
+            # Searches of a BitBoard give deck indices, not positions.
+            for prefix, lasts in self._search(method, cards):
+                for last in lasts:
+                    yield prefix + (last,)
+            return
+        cards = list(cards)
+        for prefix, lasts in self._search(method, self._encode_board(cards)):
+            hand = tuple(cards[position] for position in prefix)
+            for last in lasts:
+                yield hand + (cards[last],)
+
+    def has_set(self, cards):
+        ''' Check whether cards hold any set, stopping at the first found. '''
+        for _ in self._search('has_set', self._encode_board(cards)):
             return True
+        return False
+
+    def count_sets(self, cards):
+        ''' Count the sets in cards without building them. '''
+        return sum(len(lasts) for _, lasts
+                   in self._search('count_sets', self._encode_board(cards)))
+
+    def use_table(self, path=None, max_entries=pow(2, 25)):
+        ''' Precompute a SetTable of this deck's set completions, or map it
+            from path if saved there before, and search boards by looking
+            completions up in it from now on. Returns the SetTable, which is
+            shared with other solvers of the same attributes and path. '''
+        table = self._tables.get(path)
+        if table is None:
+            table = self._tables[path] = SetTable(self, path, max_entries)
+        self._table = table
+        return table
+
+    def add_hook(self, hook):
+        ''' Instrument this solver: after every iter_sets, find_all_sets,
+            has_set or count_sets search, call hook with its SolverStats.
+            Without hooks the searches run uninstrumented. '''
+        if self._hooks is None:
+            self._hooks = []
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        ''' Stop calling hook; the last hook removed turns instrumentation
+            off. '''
+        self._hooks.remove(hook)
+        if not self._hooks:
+            self._hooks = None
+
+    @contextmanager
+    def instrumented(self, capture=None):
+        ''' Instrument every search made inside a with block, yielding an
+            Instrumentation whose calls list fills with SolverStats. capture
+            may be 'cprofile' or 'tracemalloc' to also profile the block. '''
+        if capture not in (None, 'cprofile', 'tracemalloc'):
+            raise ValueError('capture must be cprofile or tracemalloc.')
+        if capture == 'cprofile':
+            import cProfile
+            import pstats
+        elif capture == 'tracemalloc':
+            import tracemalloc
+
+        record = Instrumentation()
+        hook = record.calls.append
+        self.add_hook(hook)
+        profiler = cProfile.Profile() if capture == 'cprofile' else None
+        tracing = capture == 'tracemalloc' and not tracemalloc.is_tracing()
+        if profiler:
+            profiler.enable()
+        elif tracing:
+            tracemalloc.start()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+                record.profile = pstats.Stats(profiler)
+            elif capture == 'tracemalloc':
+                record.snapshot = tracemalloc.take_snapshot()
+                if tracing:
+                    tracemalloc.stop()
+            self.remove_hook(hook)
+
+    def _search(self, method, digits):
+        ''' Search digits with _iter_completions, instrumented when the
+            solver has hooks. method names the caller for SolverStats. '''
+        if self._hooks is None:
+            return self._iter_completions(digits)
+        return self._instrumented_search(method, digits)
+
+    def _instrumented_search(self, method, digits):
+        stats = SolverStats(method, len(digits), list(self.attributes))
+        start = perf_counter()
+        try:
+            for prefix, lasts in self._iter_completions(digits, stats=stats):
+                stats.hands_accepted += len(lasts)
+                yield prefix, lasts
+        finally:
+            # Runs when the search is exhausted or abandoned, as by has_set.
+            stats.wall_time = perf_counter() - start
+            for hook in list(self._hooks or ()):
+                hook(stats)
+
+    def _threaded_search(self, digits, threads):
+        ''' Find every set in digits across threads, as tuples of positions
+            in the order _iter_completions gives them. Each card is a unit
+            of work: the sets it leads, searched with it fixed. Each thread
+            is dealt a run of units with about the same number of hands,
+            works through its own from the front, and once they are done
+            steals from the back of the others' runs. '''
+        num_cards = len(digits)
+        hand_size = self._hand_size
+        units = range(max(0, num_cards - hand_size + 1))
+        hands = [comb(num_cards - first - 1, hand_size - 1) for first in units]
+        share = max(1, sum(hands)) / threads
+        queues = [deque() for _ in range(threads)]
+        dealt = 0
+        for first in units:
+            queues[min(threads - 1, int(dealt / share))].append(first)
+            dealt += hands[first]
+
+        # Compile the schema here, before the threads look it up.
+        feasible = self._partial_scores[1]
+        results = [()] * len(units)
+
+        def work(own, stats):
+            while True:
+                try:
+                    first = own.popleft()
+                except IndexError:
+                    first = steal()
+                    if first is None:
+                        return
+                card_scores = self._digit_weights(digits[first])
+                if not feasible.issuperset(card_scores):
+                    continue
+                rest = first + 1
+                sets = []
+                for hand, lasts in self._iter_completions(
+                        digits[rest:], fixed=(digits[first],), stats=stats):
+                    hand = (first,) + tuple(rest + position
+                                            for position in hand)
+                    sets.extend(hand + (rest + last,) for last in lasts)
+                results[first] = sets
+
+        def steal():
+            # Units are never added once dealt, so a run found empty stays
+            # empty; every run found empty means the work is done.
+            for queue in sorted(queues, key=len, reverse=True):
+                try:
+                    return queue.pop()
+                except IndexError:
+                    continue
+            return None
+
+        from concurrent.futures import ThreadPoolExecutor
+        hooks = self._hooks
+        stats = [SolverStats('find_all_sets', num_cards,
+                             list(self.attributes)) if hooks else None
+                 for _ in queues]
+        start = perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            for done in [pool.submit(work, queue, thread_stats)
+                         for queue, thread_stats in zip(queues, stats)]:
+                done.result()
+        found = [a_set for sets in results for a_set in sets]
+
+        if hooks:
+            # One search's stats. Each unit is searched with its first card
+            # fixed, which takes the pruned search even where the serial one
+            # looks pairs up, so hands_examined can differ from it; the sets
+            # found are the same.
+            total = stats[0]
+            for thread_stats in stats[1:]:
+                total.hands_examined += thread_stats.hands_examined
+                total.rejections.update(thread_stats.rejections)
+            total.hands_accepted = len(found)
+            total.wall_time = perf_counter() - start
+            for hook in list(hooks):
+                hook(total)
+        return found
+
+    def _iter_completions(self, digits, fixed=(), stats=None):
+        ''' Search a board given as variant index tuples. Yields pairs of a
+            tuple of positions one card short of a set, and the ascending
+            positions of every later card that completes it, never empty.
+            Sets come out in the order combinations() would give them.
+            fixed holds the variant indices of cards that are off the board
+            but part of every hand, leaving fewer cards to find. Pass a
+            SolverStats as stats to count the work done. A BitBoard may be
+            passed for digits, when deck indices take the place of positions.
+            '''
+        if isinstance(digits, BitBoard):
+            return self._iter_bit_completions(digits, stats)
+        elif self._table is not None and not fixed:
+            return self._table._iter_completions(digits, stats)
+        elif self._standard and self._hand_size == 3 and not fixed:
+            return self._iter_pair_completions(digits, stats)
+        elif self._hand_size >= 3:
+            return self._iter_pruned_completions(digits, fixed, stats)
+        return self._iter_scored_completions(digits, fixed, stats)
+
+    def _iter_bit_completions(self, board, stats=None):
+        ''' Search a BitBoard, building hands card by card in deck order as
+            _iter_pruned_completions does. The last card of each hand is
+            found by working out its deck index, from the SetTable or the
+            completion of each attribute's score, and testing its bit. Rules
+            that leave the last card open search the board's cards as a list
+            instead. '''
+        mask = board.mask
+        indices = list(board)
+        last_depth = self._hand_size - 1
+        completions = self._completions
+        if completions is None or self._hand_size < 3:
+            for prefix, lasts in self._iter_completions(
+                    [self._index_to_digits(index) for index in indices],
+                    stats=stats):
+                yield (tuple(indices[position] for position in prefix),
+                       [indices[position] for position in lasts])
+            return
+
+        if self._table is not None:
+            table = self._table.table
+            deck_size = self._deck_size
+
+            def extend(hand, key, start):
+                for position in range(start, len(indices) - last_depth
+                                      + len(hand) + 1):
+                    index = indices[position]
+                    hand_key = key * deck_size + index
+                    if len(hand) + 1 < last_depth:
+                        yield from extend(hand + (index,), hand_key,
+                                          position + 1)
+                        continue
+                    if stats is not None:
+                        stats.hands_examined += 1
+                    # Runs no card completes hold a value past the deck,
+                    # whose bit is never set.
+                    last = table[hand_key]
+                    if last > index and mask >> last & 1:
+                        yield hand + (index,), [last]
+
+            yield from extend((), 0, 0)
+            return
+
+        elif self._standard and self._hand_size == 3:
+            # As BoardIndex does, add two cards' packed variant indices and
+            # remember the third card's deck index by the sum.
+            thirds = self._pair_thirds
+            packed_cards = self._packed_cards
+            packed = []
+            for index in indices:
+                card_packed = packed_cards.get(index)
+                if card_packed is None:
+                    card_packed = packed_cards[index] = _pack_digits(
+                        self._index_to_digits(index))
+                packed.append(card_packed)
+            for first in range(len(indices)):
+                if stats is not None:
+                    stats.hands_examined += len(indices) - first - 1
+                first_packed = packed[first]
+                for second in range(first + 1, len(indices)):
+                    pair_sum = first_packed + packed[second]
+                    third = thirds.get(pair_sum)
+                    if third is None:
+                        third = thirds[pair_sum] = self._digits_to_index(
+                            [-(a + b) % 3 for a, b in zip(
+                                self._index_to_digits(indices[first]),
+                                self._index_to_digits(indices[second]))])
+                    if third > indices[second] and mask >> third & 1:
+                        yield (indices[first], indices[second]), [third]
+            return
+
+        place_completions = self._place_completions
+        card_weights = [self._digit_weights(self._index_to_digits(index))
+                        for index in indices]
+        partial_scores = self._partial_scores
+
+        def extend(hand, hand_scores, start):
+            depth = len(hand)
+            if depth == last_depth:
+                last = sum(lookup[score] for lookup, score
+                           in zip(place_completions, hand_scores))
+                if last > hand[-1] and mask >> last & 1:
+                    yield hand, [last]
+                return
+
+            feasible = partial_scores[depth + 1]
+            candidates = range(start, len(indices) - (last_depth - depth))
+            if stats is not None:
+                stats.hands_examined += len(candidates)
+            for position in candidates:
+                scores = tuple(map(add, hand_scores, card_weights[position]))
+                if feasible.issuperset(scores):
+                    yield from extend(hand + (indices[position],), scores,
+                                      position + 1)
+                elif stats is not None:
+                    stats._reject(scores, feasible)
+
+        yield from extend((), (0,) * len(self._weights), 0)
+
+    def _iter_pair_completions(self, digits, stats=None):
+        ''' Search a three variant board. Any two cards determine the one
+            card that completes their set, so index the cards by their
+            variants and look up the completion of every pair. '''
+        positions = self._index_positions(digits)
+        num_cards = len(digits)
+        for first in range(num_cards):
+            if stats is not None:
+                stats.hands_examined += num_cards - first - 1
+            first_digits = digits[first]
+            for second in range(first + 1, num_cards):
+                # Per attribute, the third variation is the same one if the
+                # pair matches, otherwise the one left over: -(a + b) mod 3
+                # either way.
+                third_digits = tuple(-(a + b) % 3 for a, b
+                                     in zip(first_digits, digits[second]))
+                matches = positions.get(third_digits)
+                if matches:
+                    thirds = matches[bisect_right(matches, second):]
+                    if thirds:
+                        yield (first, second), thirds
+
+    def _iter_pruned_completions(self, digits, fixed=(), stats=None):
+        ''' Search a board by building hands card by card, dropping a
+            partial hand as soon as any attribute can no longer reach a valid
+            score. Under rules where the last card of a hand is then fully
+            determined, it is looked up rather than searched for; otherwise
+            the cards after the hand are scored for it. '''
+        positions = self._index_positions(digits)
+        card_weights = [self._digit_weights(card_digits)
+                        for card_digits in digits]
+        partial_scores = self._partial_scores
+        completions = self._completions
+        valid_scores = self._valid_scores
+        last_depth = self._hand_size - 1
+        num_cards = len(digits)
+
+        def extend(hand, hand_scores):
+            # hand holds board positions in increasing order, hand_scores the
+            # partial score for each attribute, fixed cards included.
+            depth = len(fixed) + len(hand)
+            start = hand[-1] + 1 if hand else 0
+            if depth == last_depth and completions is None:
+                if stats is not None:
+                    stats.hands_examined += num_cards - start
+                lasts = [position for position in range(start, num_cards)
+                         if valid_scores.issuperset(
+                             map(add, hand_scores, card_weights[position]))]
+                if lasts:
+                    yield hand, lasts
+                return
+            elif depth == last_depth:
+                last_digits = tuple(completions[score]
+                                    for score in hand_scores)
+                matches = positions.get(last_digits)
+                if matches:
+                    lasts = matches[bisect_left(matches, start):]
+                    if lasts:
+                        yield hand, lasts
+                return
+
+            feasible = partial_scores[depth + 1]
+            # Leave enough cards after this one to fill the rest of the hand.
+            candidates = range(start, num_cards - (last_depth - depth))
+            if stats is not None:
+                stats.hands_examined += len(candidates)
+            for position in candidates:
+                scores = tuple(map(add, hand_scores, card_weights[position]))
+                if feasible.issuperset(scores):
+                    yield from extend(hand + (position,), scores)
+                elif stats is not None:
+                    stats._reject(scores, feasible)
+
+        fixed_scores = [sum(scores) for scores
+                        in zip(*[self._digit_weights(card_digits)
+                                 for card_digits in fixed])]
+        return extend((), tuple(fixed_scores) or (0,) * len(self._weights))
+
+    def _iter_scored_completions(self, digits, fixed=(), stats=None):
+        ''' Search a board by scoring every combination; only sets of fewer
+            than three cards, too small for pruning to pay, need this. '''
+        card_weights = [self._digit_weights(card_digits)
+                        for card_digits in digits]
+        fixed_weights = [self._digit_weights(card_digits)
+                         for card_digits in fixed]
+        for hand in combinations(range(len(digits)),
+                                 self._hand_size - len(fixed)):
+            if stats is not None:
+                stats.hands_examined += 1
+            if self._is_valid_hand(fixed_weights + [card_weights[position]
+                                                    for position in hand]):
+                yield hand[:-1], [hand[-1]]
+
+    def _encode_board(self, cards):
+        ''' Return the variant index tuple of each card, or a BitBoard as it
+            is. '''
+        if isinstance(cards, BitBoard):
+            return cards
+        return [self._card_digits(card) for card in cards]
+
+    def _index_positions(self, digits):
+        ''' Map each variant index tuple on a board to its positions. Positions
+            are appended in order, so each list is sorted. '''
+        positions = defaultdict(list)
+        for position, card_digits in enumerate(digits):
+            positions[card_digits].append(position)
+        return positions
+
+    def _find_sets_by_combination(self, cards):
+        ''' Score every combination of cards to find all sets. '''
+        # Weigh each card once, then walk the weight combinations in step
+        # with the card combinations.
+        cards = list(cards)
+        card_weights = [self._card_weights(card) for card in cards]
+        is_valid_hand = self._is_valid_hand
 
-    def find_all_sets(self, cards):
-        ''' Given a number of cards, find all possible sets. '''
         sets = []
-        for hand in combinations(cards, len(self.attributes['number'])):
-            if self.check_for_set(hand):
+        for hand, hand_weights in zip(combinations(cards, self._hand_size),
+                                      combinations(card_weights,
+                                                   self._hand_size)):
+            if is_valid_hand(hand_weights):
                 sets.append(hand)
         return sets
 
+    def find_all_sets_vectorized(self, cards, chunk_size=65536):
+        ''' Given a number of cards, find all possible sets by scoring
+            combinations in numpy batches of up to chunk_size hands. Needs
+            numpy; returns the same sets as find_all_sets. '''
+        numpy = _import_numpy()
+        if numpy is None:
+            raise ImportError('find_all_sets_vectorized requires numpy.')
+
+        cards = list(cards)
+        size_of_hand = self._hand_size
+
+        # Scores can reach size_of_hand ** size_of_hand, or more under mixed
+        # rules, which outgrows int64 for very large games; fall back to
+        # Python ints there.
+        if size_of_hand * max(map(max, self._weights)) < pow(2, 63):
+            dtype = numpy.int64
+        else:
+            dtype = object
+
+        # (attributes, variations) matrix of the schema weights, gathered into
+        # a (cards, attributes) matrix of each card's score per attribute.
+        weights = numpy.array(self._weights, dtype=dtype)
+        # Shaped explicitly, so an empty board still has a column per
+        # attribute.
+        digits = numpy.array([self._card_digits(card) for card in cards],
+                             dtype=numpy.intp).reshape(len(cards),
+                                                       len(self.attributes))
+        card_scores = weights[numpy.arange(len(weights)), digits]
+        valid_scores = numpy.array(sorted(self._valid_scores), dtype=dtype)
+
+        sets = []
+        for chunk in _hand_chunks(numpy, len(cards), size_of_hand,
+                                  chunk_size):
+            # (hands, attributes) totals, valid when every attribute scores.
+            hand_scores = card_scores[chunk].sum(axis=1)
+            valid = numpy.isin(hand_scores, valid_scores).all(axis=1)
+            for hand in chunk[valid].tolist():
+                sets.append(tuple(cards[position] for position in hand))
+        return sets
+
+    def deck_index(self, card):
+        ''' Return the deck index of a card given as a deck index, a numpy
+            integer such as deal_boards gives, a Card or a CompactCard.
+            Raise ValueError for an index outside the deck. '''
+        if isinstance(card, Integral):
+            # int(), so numpy integers index and shift as ints.
+            card = int(card)
+            if not 0 <= card < self._deck_size:
+                raise ValueError('Card {} is not in the deck.'.format(card))
+            return card
+        elif isinstance(card, CompactCard):
+            return card.index
+        return self._digits_to_index(self._card_digits(card))
+
+    def encode_card(self, card):
+        ''' Convert a Card into a CompactCard using this solver's attribute
+            order. '''
+        digits = self._card_digits(card)
+        return CompactCard(self._digits_to_index(digits), digits)
+
+    def decode_card(self, compact_card):
+        ''' Convert a CompactCard made by this solver back into a Card. '''
+        return Card._from_variants({attribute: variations[index]
+                                    for (attribute, variations), index
+                                    in zip(self.attributes.items(),
+                                           compact_card.digits)})
+
+    def compact_card(self, index):
+        ''' Return the CompactCard at index in this solver's deck order. '''
+        return CompactCard(index, self._index_to_digits(index))
+
+    def canonical_board(self, cards, max_choices=pow(2, 13)):
+        ''' Map a board onto the one representative of every board a
+            symmetry of the deck makes it into: reordering attributes that
+            follow the same rule, and relabelling each attribute's
+            variations, which with three variations takes in the affine
+            translations. Rules given as functions keep their attributes'
+            places and labels. Cards may be deck indices, Cards or
+            CompactCards. Returns the representative as a sorted tuple of
+            deck indices, and the BoardTransform that maps the board's
+            cards onto it; invert maps the representative's cards, and so
+            its sets, back.
+
+            The representative is the board whose cards, sorted and read
+            attribute by attribute, come first. Each attribute read only
+            depends on the ones before it, so the search fixes one slot at a
+            time, keeping every choice of attribute and labels that reads
+            least there. What is left to read only depends on which cards
+            are tied so far and what they hold on the attributes still to
+            place, up to those attributes' labels, so choices that leave the
+            same are merged, and tied variations whose cards hold the same
+            are only tried in one order. Symmetric boards, a whole deck say,
+            keep few choices. A board that still needs more than
+            max_choices attributes and labellings tried is its own
+            representative, with a transform that moves nothing, so no
+            board stalls the search; its copies then miss each other. '''
+        rows = [self._index_to_digits(self.deck_index(card))
+                for card in cards]
+        rules = [self.rules.rule(attribute) for attribute in self.attributes]
+        num_columns = len(rules)
+        # Choices so far: attributes placed, rows grouped by their labelled
+        # variations so far, in order, and the labels given.
+        branches = [((), [list(range(len(rows)))], ())]
+        tried = 0
+        for slot in range(num_columns):
+            best, children, seen = None, [], set()
+            for columns, groups, labels in branches:
+                for column in range(num_columns):
+                    if column in columns or rules[column] != rules[slot]:
+                        continue
+                    rest = [other for other in range(num_columns)
+                            if other != column and other not in columns]
+                    if callable(rules[slot]):
+                        if column != slot:
+                            continue
+                        labelings = [tuple(range(self._variants))]
+                    else:
+                        labelings = self._canonical_labelings(rows, groups,
+                                                              column, rest)
+                    for labeling in labelings:
+                        tried += 1
+                        if tried > max_choices:
+                            return self._plain_board(rows)
+                        split = [sorted(group, key=lambda row: labeling[
+                                     rows[row][column]]) for group in groups]
+                        read = tuple(labeling[rows[row][column]]
+                                     for group in split for row in group)
+                        if best is None or read < best:
+                            best, children, seen = read, [], set()
+                        elif read > best:
+                            continue
+                        new_groups = []
+                        for group in split:
+                            for _, tied in groupby(group, key=lambda row: (
+                                    labeling[rows[row][column]])):
+                                new_groups.append(list(tied))
+                        key = (frozenset(columns + (column,)),
+                               _tied_contents(rows, new_groups, rest))
+                        if key not in seen:
+                            seen.add(key)
+                            children.append((columns + (column,), new_groups,
+                                             labels + (labeling,)))
+            branches = children
+
+        columns, _, labels = branches[0]
+        transform = BoardTransform(self, columns, labels)
+        return (tuple(sorted(transform.apply(self._digits_to_index(digits))
+                             for digits in rows)), transform)
+
+    def _plain_board(self, rows):
+        ''' Return rows as their own representative, for canonical_board. '''
+        transform = BoardTransform(
+            self, range(len(self.attributes)),
+            [range(self._variants)] * len(self.attributes))
+        return (tuple(sorted(self._digits_to_index(digits)
+                             for digits in rows)), transform)
+
+    def _canonical_labelings(self, rows, groups, column, rest):
+        ''' Generate each labelling of column's variations that reads least
+            over groups of rows, in order, with each group's labels sorted:
+            the variations most common in the first group come first, ties
+            broken by the next group and so on, and variations still tied
+            after every group tried in each order, though only one order of
+            those whose cards hold the same in every group on the columns
+            in rest. Variations on no card take the last labels, in
+            order. '''
+        cells = [sorted({row[column] for row in rows})]
+        for group in groups:
+            counts = Counter(rows[row][column] for row in group)
+            refined = []
+            for cell in cells:
+                by_count = defaultdict(list)
+                for digit in cell:
+                    by_count[counts[digit]].append(digit)
+                refined.extend(by_count[count]
+                               for count in sorted(by_count, reverse=True))
+            cells = refined
+        present = set(chain.from_iterable(cells))
+        absent = [digit for digit in range(self._variants)
+                  if digit not in present]
+        contents = {digit: tuple(_group_contents(
+                        rows, [row for row in group
+                               if rows[row][column] == digit], rest)
+                        for group in groups)
+                    for digit in present}
+        for order in product(*[_distinct_orders(cell, contents.get)
+                               for cell in cells]):
+            labeling = [0] * self._variants
+            for label, digit in enumerate(chain(chain.from_iterable(order),
+                                                absent)):
+                labeling[digit] = label
+            yield tuple(labeling)
+
+    def _digits_to_index(self, digits):
+        ''' Read variant indices as a base-n integer, first attribute most
+            significant. '''
+        variants = self._variants
+        index = 0
+        for digit in digits:
+            index = index * variants + digit
+        return index
+
+    def _index_to_digits(self, index):
+        ''' Inverse of _digits_to_index. '''
+        variants = self._variants
+        digits = []
+        for attribute in self.attributes:
+            index, digit = divmod(index, variants)
+            digits.append(digit)
+        return tuple(reversed(digits))
+
+    def _card_digits(self, card):
+        ''' Return a card's variations as a tuple of variant indices, in
+            the order of the solver's attributes. '''
+        if isinstance(card, CompactCard):
+            return card.digits
+        return tuple(self._variant_index[attribute][card.attributes[attribute]]
+                     for attribute in self.attributes)
+
     def print_cards(self, cards):
         ''' Given iterable of cards, print their attributes. '''
         for card in cards:
@@ -160,6 +1877,51 @@ class SetSolver(object):
             Attributes for cards from self.attributes. '''
         return [Card(self.attributes) for card in range(num_to_deal)]
 
+    def deal_boards(self, n_boards, board_size=12, seed=None):
+        ''' Deal n_boards boards of board_size different cards at once, as
+            an (n_boards, board_size) numpy array of deck indices drawn by a
+            numpy.random.Generator seeded with seed, so the same arguments
+            deal the same boards. Needs numpy. No Cards are made; turn a
+            board into Cards with board_cards when they are wanted. '''
+        numpy = _import_numpy()
+        if numpy is None:
+            raise ImportError('deal_boards requires numpy.')
+        deck_size = self._deck_size
+        if not 0 <= board_size <= deck_size:
+            raise ValueError('A board of {} cards does not fit a deck of '
+                             '{}.'.format(board_size, deck_size))
+        rng = numpy.random.default_rng(seed)
+
+        if board_size * board_size <= deck_size:
+            # Most boards this small draw no card twice, so draw with
+            # replacement and redraw the boards that did.
+            boards = rng.integers(deck_size, size=(n_boards, board_size))
+            while True:
+                ordered = numpy.sort(boards, axis=1)
+                repeats = (ordered[:, 1:] == ordered[:, :-1]).any(axis=1)
+                redraw = int(repeats.sum())
+                if not redraw:
+                    return boards
+                boards[repeats] = rng.integers(deck_size,
+                                               size=(redraw, board_size))
+
+        # Otherwise shuffle a copy of the deck for each board and deal from
+        # its top, a million or so cards' worth of boards at a time.
+        boards = numpy.empty((n_boards, board_size), dtype=numpy.int64)
+        deck = numpy.arange(deck_size)
+        step = max(1, pow(2, 20) // deck_size)
+        for start in range(0, n_boards, step):
+            count = min(step, n_boards - start)
+            shuffled = rng.permuted(numpy.tile(deck, (count, 1)), axis=1)
+            boards[start:start + count] = shuffled[:, :board_size]
+        return boards
+
+    def board_cards(self, indices):
+        ''' Return Cards for a board of deck indices, such as a row of
+            deal_boards. '''
+        return [self.decode_card(self.compact_card(int(index)))
+                for index in indices]
+
 
 class Card(object):
     ''' Stores card attributes. Takes attribute dict from SetSolver. If
@@ -179,6 +1941,14 @@ class Card(object):
         card_attribs = '\n'.join('{}: {}'.format(attribute, value) for attribute, value in self.attributes.items())
         return header + card_attribs
 
+    @classmethod
+    def _from_variants(cls, attributes):
+        ''' Make a card from a dict of variations that is already known to
+            be valid, e.g. one decoded by a SetSolver. '''
+        card = cls.__new__(cls)
+        card.attributes = attributes
+        return card
+
     def _parse_attribs(self, attributes, randomize):
         ''' '''
         if randomize:
@@ -192,3 +1962,71 @@ class Card(object):
                     raise TypeError('Card attributes must be strings.')
 
             return attributes
+
+
+class CompactCard(object):
+    ''' Integer-encoded card. Stores the card's variant indices, in the
+        attribute order of the SetSolver that made it, and the base-n integer
+        they spell out. Make these with SetSolver.encode_card or
+        SetSolver.compact_card, and turn them back into Cards with
+        SetSolver.decode_card. '''
+    __slots__ = ('index', 'digits')
+
+    def __init__(self, index, digits):
+        self.index = index
+        self.digits = digits
+
+    def __repr__(self):
+        return '< CompactCard: {} {} >'.format(self.index, self.digits)
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactCard):
+            return NotImplemented
+        return self.digits == other.digits
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(self.digits)
+
+
+class SolverStats(object):
+    ''' Counters for one instrumented search. hands_examined counts the
+        pairs, partial hands or whole hands scored; hands_accepted counts
+        the sets found; rejections counts, per attribute, the partial hands
+        dropped because that attribute could no longer score. Three variant
+        searches look pairs up whole, so they reject nothing per attribute.
+        What is counted as examined depends on the search taken, so a
+        threaded find_all_sets may count other hands than a serial one. '''
+    def __init__(self, method, num_cards, attributes):
+        self.method = method
+        self.num_cards = num_cards
+        self.hands_examined = 0
+        self.hands_accepted = 0
+        self.rejections = Counter()
+        self.wall_time = 0.0
+        self._attributes = attributes
+
+    def __repr__(self):
+        return ('< SolverStats: {} of {} cards; {} examined; {} accepted; '
+                '{:.6f}s >'.format(self.method, self.num_cards,
+                                   self.hands_examined, self.hands_accepted,
+                                   self.wall_time))
+
+    def _reject(self, scores, feasible):
+        ''' Charge a dropped partial hand to its first failing attribute. '''
+        for attribute, score in zip(self._attributes, scores):
+            if score not in feasible:
+                self.rejections[attribute] += 1
+                return
+
+
+class Instrumentation(object):
+    ''' What SetSolver.instrumented collects: the SolverStats of each search,
+        and a pstats.Stats profile or tracemalloc snapshot if captured. '''
+    def __init__(self):
+        self.calls = []
+        self.profile = None
+        self.snapshot = None
@@ -0,0 +1,149 @@
+# usr/bin/env python3
+
+# Benchmarks for the SetSolver hot paths. Run them all with
+#
+#    python3 set_solver_bench.py
+#
+# Each benchmark is timed for at least --min-time seconds and reported as
+# operations per second, along with the peak memory a single operation
+# allocates. Boards are dealt from pinned seeds, so runs are comparable
+# across changes. Pass --filter to run only benchmarks whose name contains
+# a given string, e.g. --filter five/find_all_sets.
+#
+# The cold_start benchmark times fresh interpreters importing play_set and
+# solving one board with a preset solver, less bare interpreter start-up,
+# and the run fails if that exceeds COLD_START_BUDGET.
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from play_set import get_random_attributes, three_hand, four_hand, five_hand
+from set_solver import SetSolver, Card, _import_numpy
+
+
+SEED = 2016
+BOARD_SIZES = (12, 21, 30, 81)
+PRESETS = (('three', three_hand),
+           ('four', four_hand),
+           ('five', five_hand),
+           ('random6', get_random_attributes(6)))
+# Seconds a fresh process may take, past interpreter start-up, to import
+# play_set and solve a board. Importing numpy alone would take most of it.
+COLD_START_BUDGET = 0.1
+COLD_START = ('import play_set; solver = play_set.five_solver; '
+              'solver.find_all_sets(solver.deal_game(12))')
+
+
+def deal_board(solver, size, seed=SEED):
+    ''' Deal size different cards from solver's deck, reproducibly. '''
+    rng = random.Random('{}:{}'.format(seed, size))
+    return [solver.decode_card(solver.compact_card(index))
+            for index in rng.sample(range(solver.deck_size), size)]
+
+
+def make_benchmarks():
+    ''' Return a list of (name, function) pairs to time. '''
+    benchmarks = []
+    for preset, attributes in PRESETS:
+        solver = SetSolver(attributes)
+        hand = deal_board(solver, solver._hand_size)
+
+        benchmarks.append(('{}/make_validation_schema'.format(preset),
+                           solver.make_validation_schema))
+        benchmarks.append(('{}/Card'.format(preset),
+                           lambda attributes=attributes: Card(attributes)))
+        if _import_numpy() is not None:
+            benchmarks.append(('{}/deal_boards/1000'.format(preset),
+                               lambda solver=solver:
+                               solver.deal_boards(1000, seed=SEED)))
+        benchmarks.append(('{}/check_for_set'.format(preset),
+                           lambda solver=solver, hand=hand:
+                           solver.check_for_set(hand)))
+        for size in BOARD_SIZES:
+            board = deal_board(solver, size)
+            benchmarks.append(('{}/find_all_sets/{}'.format(preset, size),
+                               lambda solver=solver, board=board:
+                               solver.find_all_sets(board)))
+    return benchmarks
+
+
+def time_ops(function, min_time):
+    ''' Call function repeatedly for at least min_time seconds, doubling the
+        batch size each round. Returns operations per second. '''
+    random.seed(SEED)
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls / elapsed
+        calls *= 2
+
+
+def peak_memory(function):
+    ''' Return the peak bytes allocated while calling function once. '''
+    random.seed(SEED)
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def cold_start(runs=5):
+    ''' Return the seconds a fresh interpreter takes to run COLD_START, past
+        bare start-up, taking the fastest of runs tries at each. '''
+    def fastest(code):
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], check=True,
+                           cwd=os.path.dirname(os.path.abspath(__file__)))
+            times.append(time.perf_counter() - start)
+        return min(times)
+    return fastest(COLD_START) - fastest('pass')
+
+
+def run(name_filter='', min_time=0.2):
+    ''' Run the benchmarks whose names contain name_filter and print a line
+        of results for each. Returns False if cold start ran over budget. '''
+    print('{:<32} {:>14} {:>12}'.format('benchmark', 'ops/sec', 'peak bytes'))
+    for name, function in make_benchmarks():
+        if name_filter not in name:
+            continue
+        print('{:<32} {:>14.1f} {:>12}'.format(name,
+                                               time_ops(function, min_time),
+                                               peak_memory(function)))
+
+    if name_filter not in 'cold_start':
+        return True
+    seconds = cold_start()
+    print('{:<32} {:>13.4f}s {:>11.4f}s'.format('cold_start (budget)', seconds,
+                                                COLD_START_BUDGET))
+    if seconds > COLD_START_BUDGET:
+        print('cold start is over budget')
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SetSolver.')
+    parser.add_argument('--filter', default='',
+                        help='only run benchmarks whose name contains this')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='seconds to time each benchmark for')
+    args = parser.parse_args()
+    if not run(args.filter, args.min_time):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,24 @@
 # usr/bin/env python
 
+import os
 import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
+from itertools import combinations, permutations, product
+from unittest import mock
 
-from set_solver import SetSolver, Card
+from set_solver import (ATTRIBS, SetSolver, SetRules, BoardIndex, BitBoard,
+                        BoardTransform, SetCache, SetTable, Card,
+                        CompactCard, Deck, Game, simulate_game, solve_many)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class TestConstructSolver(unittest.TestCase):
@@ -22,6 +37,7 @@ class TestConstructSolver(unittest.TestCase):
                    'number': [num for num in range(3)]}
         a_solver = SetSolver(attribs)
         self.assertIsNotNone(a_solver.attributes)
+        self.assertEqual(a_solver.deck_size, 81)
 
     def test_with_bad_attributes(self):
         ''' SetSolver should raise TypeError if passed malform attributes'''
@@ -276,6 +292,25 @@ class TestSetChecking(unittest.TestCase):
         self.assertFalse(four_solver.check_for_set([card1, card2, card3, card1]))
         self.assertFalse(five_solver.check_for_set([card1, card2, card3, card4, card1]))
 
+    def test_random_hands_match_schema(self):
+        ''' Compiled scoring should agree with tallying the schema dict. '''
+        n = random.randrange(5, 11)
+        n_hand = {key: [value for value in range(n)]
+                  for key in range(n)}
+        n_hand['number'] = [value for value in range(n)]
+        n_solver = SetSolver(n_hand)
+        schema = n_solver.schema
+
+        for hand in [n_solver.deal_game(n) for _ in range(50)]:
+            hand_scores = [sum(schema[attribute][card.attributes[attribute]]
+                               for card in hand)
+                           for attribute in n_hand]
+            expected = all(score in schema['valid_scores']
+                           for score in hand_scores)
+            self.assertEqual(n_solver.check_for_set(hand), expected)
+        self.assertTrue(n_solver.check_for_set([hand[0]] * n))
+
+
 class TestGameChecking(unittest.TestCase):
     ''' Test SetSolver's ability to count total instances of sets
         in a given hand. '''
@@ -332,6 +367,953 @@ class TestGameChecking(unittest.TestCase):
         self.assertEqual(four_hand_sets, 2)
         self.assertEqual(five_hand_sets, 2)
 
+class TestLazySets(unittest.TestCase):
+    ''' Test SetSolver's iter_sets, has_set and count_sets. '''
+
+    def test_agree_with_find_all_sets(self):
+        ''' Lazy entry points should agree with find_all_sets. '''
+        two_hand   = {'colors': ['red', 'blue'],
+                      'shape':  ['circle', 'square'],
+                      'fill':   ['none', 'stripe'],
+                      'number': ['one', 'two']}
+        three_hand = {'colors': ['red', 'blue', 'yellow'],
+                      'shape':  ['circle', 'square', 'diamond'],
+                      'fill':   ['none', 'stripe', 'solid'],
+                      'number': ['one', 'two', 'three']}
+        four_hand  = {'colors': ['red', 'blue', 'yellow', 'green'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot'],
+                      'number': ['one', 'two', 'three', 'four']}
+
+        for attributes in (two_hand, three_hand, four_hand):
+            solver = SetSolver(attributes)
+            game = solver.deal_game(8)
+            game = game[:1] * len(attributes['number']) + game
+            sets = solver.find_all_sets(game)
+            self.assertEqual(list(solver.iter_sets(game)), sets)
+            self.assertEqual(solver.count_sets(game), len(sets))
+            self.assertTrue(solver.has_set(game))
+
+    def test_early_exit(self):
+        ''' has_set should be False for a board without sets, and iter_sets
+            should hand over its first set without finishing the search. '''
+        three_hand = {'colors': ['red', 'blue', 'yellow'],
+                      'shape':  ['circle', 'square', 'diamond'],
+                      'fill':   ['none', 'stripe', 'solid'],
+                      'number': ['one', 'two', 'three']}
+        three_solver = SetSolver(three_hand)
+        # Cards 0, 1, 3 and 4 of the deck hold no set between them.
+        no_set = [three_solver.compact_card(index) for index in (0, 1, 3, 4)]
+        self.assertFalse(three_solver.has_set(no_set))
+        self.assertEqual(three_solver.count_sets(no_set), 0)
+
+        game = [three_solver.compact_card(0)] * 30
+        first = next(three_solver.iter_sets(game))
+        self.assertEqual(first, tuple(game[:3]))
+
+
+class TestBoardIndex(unittest.TestCase):
+    ''' Test the incremental BoardIndex against solving from scratch. '''
+
+    def assert_index_matches(self, solver, index, board):
+        self.assertEqual(sorted(sorted(map(id, a_set))
+                                for a_set in index.sets()),
+                         sorted(sorted(map(id, a_set))
+                                for a_set in solver.find_all_sets(board)))
+
+    def test_add_and_remove(self):
+        ''' The index should track the sets of a board as cards are added
+            and removed, for 3, 4 and 5 variant games. '''
+        three_hand = {'colors': ['red', 'blue', 'yellow'],
+                      'shape':  ['circle', 'square', 'diamond'],
+                      'fill':   ['none', 'stripe', 'solid'],
+                      'number': ['one', 'two', 'three']}
+        four_hand  = {'colors': ['red', 'blue', 'yellow', 'green'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot'],
+                      'number': ['one', 'two', 'three', 'four']}
+        five_hand  = {'colors': ['red', 'blue', 'yellow', 'green', 'purple'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval', 'zig'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot', 'zag'],
+                      'number': ['one', 'two', 'three', 'four', 'five']}
+
+        for attributes in (three_hand, four_hand, five_hand):
+            solver = SetSolver(attributes)
+            # Copies of a few cards, so every board has sets to track.
+            size = len(attributes['number'])
+            board = [Card(card.attributes, randomize=False)
+                     for card in solver.deal_game(3) * size]
+            board += solver.deal_game(12)
+            index = BoardIndex(solver, board)
+            self.assertTrue(index.has_set())
+            self.assert_index_matches(solver, index, board)
+
+            for _ in range(10):
+                card = random.choice(board)
+                board.remove(card)
+                index.remove(card)
+                self.assert_index_matches(solver, index, board)
+
+                card = Card(random.choice(board).attributes, randomize=False)
+                board.append(card)
+                index.add(card)
+                self.assert_index_matches(solver, index, board)
+
+    def test_card_on_board_twice(self):
+        ''' The same card object cannot be added twice. '''
+        three_hand = {'colors': ['red', 'blue', 'yellow'],
+                      'shape':  ['circle', 'square', 'diamond'],
+                      'fill':   ['none', 'stripe', 'solid'],
+                      'number': ['one', 'two', 'three']}
+        three_solver = SetSolver(three_hand)
+        card = Card(three_hand)
+        index = BoardIndex(three_solver, [card])
+
+        self.assertRaises(ValueError, index.add, card)
+        self.assertIn(card, index)
+        self.assertEqual(len(index), 1)
+
+
+class TestBitBoard(unittest.TestCase):
+    ''' Test boards kept as bitsets over the deck. '''
+    four_hand = {'colors': ['red', 'blue', 'yellow', 'green'],
+                 'shape':  ['circle', 'square', 'diamond', 'oval'],
+                 'fill':   ['none', 'stripe', 'solid', 'polkadot'],
+                 'number': ['one', 'two', 'three', 'four']}
+
+    def assert_board_matches(self, solver, indices):
+        ''' A BitBoard's sets should be those of the same cards as a list,
+            as sorted tuples of deck indices. '''
+        cards = [solver.compact_card(index) for index in indices]
+        board = BitBoard(solver, indices)
+        expected = sorted(tuple(sorted(card.index for card in a_set))
+                          for a_set in solver.find_all_sets(cards))
+        self.assertEqual(solver.find_all_sets(board), expected)
+        self.assertEqual(solver.count_sets(board), len(expected))
+        self.assertEqual(solver.has_set(board), bool(expected))
+
+    def test_matches_list_search(self):
+        ''' Every search path should agree with solving a list. '''
+        same = SetRules(3, default='same')
+        for attributes, rules in ((ATTRIBS, None), (self.four_hand, None),
+                                  (self.four_hand, SetRules(3)),
+                                  (self.four_hand, same)):
+            solver = SetSolver(attributes, rules)
+            for size in (3, 12, 30):
+                self.assert_board_matches(solver, random.sample(
+                    range(solver.deck_size), size))
+
+    def test_with_table(self):
+        ''' Searches should look completions up in a SetTable. '''
+        solver = SetSolver(self.four_hand)
+        solver.use_table()
+        self.assert_board_matches(solver, random.sample(range(256), 30))
+        self.assert_board_matches(solver, [0, 85, 170, 255])
+
+    def test_mask_updates(self):
+        ''' Cards should come and go as bits, in any form. '''
+        solver = SetSolver(ATTRIBS)
+        card = solver.compact_card(40)
+        board = BitBoard(solver, [0, 1, 2])
+        self.assertEqual(board.mask, 0b111)
+        self.assertEqual(len(board), 3)
+        self.assertEqual(list(board), [0, 1, 2])
+        self.assertIn(1, board)
+        self.assertNotIn(card, board)
+
+        board.add(solver.decode_card(card))
+        self.assertIn(card, board)
+        board.difference_update(solver.find_all_sets(board)[0])
+        self.assertEqual(list(board), [40])
+        self.assertRaises(KeyError, board.remove, 0)
+        board.discard(40)
+        self.assertFalse(board)
+        self.assertRaises(ValueError, board.add, 81)
+
+        one, two = BitBoard(solver, [0, 1]), BitBoard(solver, [1, 2])
+        self.assertEqual(list(one | two), [0, 1, 2])
+        self.assertEqual(list(one & two), [1])
+        self.assertEqual(list(one - two), [0])
+        self.assertEqual(list(one ^ two), [0, 2])
+        self.assertEqual(one.cards(), [solver.compact_card(0),
+                                       solver.compact_card(1)])
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_array(self):
+        ''' Boards should convert to and from bool arrays. '''
+        solver = SetSolver(ATTRIBS)
+        board = BitBoard(solver, [3, 7, 80])
+        flags = board.to_array()
+        self.assertEqual(flags.shape, (81,))
+        self.assertEqual(flags.sum(), 3)
+        self.assertEqual(BitBoard.from_array(solver, flags), board)
+
+
+class TestLazySolver(unittest.TestCase):
+    ''' Test that solvers compile on first use and share what they build. '''
+
+    def test_compiled_on_first_use(self):
+        ''' A new solver should compile nothing until it is used, then share
+            its compiled schema with solvers of the same attributes. '''
+        attributes = {'colors': ['red', 'blue', 'yellow'],
+                      'shape':  ['circle', 'square', 'diamond'],
+                      'number': ['one', 'two', 'lazy']}
+        solver = SetSolver(attributes)
+        self.assertNotIn('_weights', vars(solver))
+        self.assertNotIn('schema', vars(solver))
+
+        board = solver.deal_game(9)
+        self.assertEqual(solver.find_all_sets(board),
+                         solver._find_sets_by_combination(board))
+        self.assertIn('_weights', vars(solver))
+
+        same = SetSolver(dict(attributes))
+        self.assertIs(same.schema, solver.schema)
+        self.assertIs(same._weights, solver._weights)
+        self.assertIsNot(SetSolver(ATTRIBS)._weights, solver._weights)
+        self.assertRaises(AttributeError, getattr, solver, '_missing')
+
+    def test_cheap_play_set_import(self):
+        ''' Importing play_set should build no solvers and load none of the
+            slow optional modules. '''
+        code = ('import sys, play_set; '
+                'print(sorted(set(["numpy", "pstats", "concurrent.futures"])'
+                ' & set(sys.modules)), "three_solver" in vars(play_set)); '
+                'play_set.three_solver; '
+                'print("three_solver" in vars(play_set))')
+        output = subprocess.run(
+            [sys.executable, '-c', code], check=True, capture_output=True,
+            universal_newlines=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        self.assertEqual(output.split('\n'), ['[] False', 'True', ''])
+
+    def test_interactive_play_set(self):
+        ''' python3 -i play_set.py should leave the preloaded solvers
+            there to use by name. '''
+        output = subprocess.run(
+            [sys.executable, '-i', 'play_set.py'], check=True,
+            capture_output=True, universal_newlines=True,
+            input='print(len(three_solver.find_all_sets(map('
+                  'three_solver.compact_card, range(81)))), '
+                  'four_solver.deck_size, five_solver.deck_size)\n',
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        self.assertIn('Preloaded solvers are', output)
+        self.assertEqual(output.split('\n')[-2], '1080 256 625')
+
+
+class TestSetCache(unittest.TestCase):
+    ''' Test the SetCache in front of find_all_sets. '''
+
+    def test_matches_find_all_sets(self):
+        ''' Cached and uncached sets should agree, card for card and in
+            order, however the board is shuffled. '''
+        four_hand  = {'colors': ['red', 'blue', 'yellow', 'green'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot'],
+                      'number': ['one', 'two', 'three', 'four']}
+        for attributes in (ATTRIBS, four_hand):
+            solver = SetSolver(attributes)
+            cache = SetCache(solver)
+            board = [Card(card.attributes, randomize=False)
+                     for card in solver.deal_game(3) * 4]
+            board += solver.deal_game(12)
+            for _ in range(5):
+                random.shuffle(board)
+                self.assertEqual(cache.find_all_sets(board),
+                                 solver.find_all_sets(board))
+            self.assertEqual((cache.hits, cache.misses), (4, 1))
+
+    def test_least_recently_used(self):
+        ''' A full cache should drop the board used longest ago. '''
+        solver = SetSolver(ATTRIBS)
+        cache = SetCache(solver, maxsize=2)
+        boards = [solver.deal_game(12) for _ in range(3)]
+        cache.find_all_sets(boards[0])
+        cache.find_all_sets(boards[1])
+        cache.find_all_sets(boards[0])
+        cache.find_all_sets(boards[2])
+        self.assertEqual(len(cache), 2)
+
+        cache.find_all_sets(boards[0])
+        self.assertEqual(cache.hits, 2)
+        cache.find_all_sets(boards[1])
+        self.assertEqual(cache.misses, 4)
+
+    def test_invalidate(self):
+        ''' invalidate should drop one board, or all of them. '''
+        solver = SetSolver(ATTRIBS)
+        cache = SetCache(solver)
+        boards = [solver.deal_game(12) for _ in range(2)]
+        for board in boards:
+            cache.find_all_sets(board)
+
+        self.assertTrue(cache.invalidate(reversed(boards[0])))
+        self.assertFalse(cache.invalidate(boards[0]))
+        self.assertEqual(len(cache), 1)
+        self.assertTrue(cache.invalidate())
+        self.assertEqual(len(cache), 0)
+        self.assertRaises(ValueError, SetCache, solver, 0)
+
+
+class TestCanonicalBoard(unittest.TestCase):
+    ''' Test mapping boards onto one representative per symmetry class. '''
+
+    def random_symmetry(self, solver):
+        columns = list(range(len(solver.attributes)))
+        random.shuffle(columns)
+        labels = [random.sample(range(solver._variants), solver._variants)
+                  for _ in columns]
+        return BoardTransform(solver, columns, labels)
+
+    def test_symmetric_boards_agree(self):
+        ''' Boards a symmetry maps onto each other should share their
+            representative, which has the same sets. '''
+        solver = SetSolver(ATTRIBS)
+        for _ in range(50):
+            board = random.sample(range(81), 12)
+            symmetry = self.random_symmetry(solver)
+            canonical, transform = solver.canonical_board(board)
+            self.assertEqual(solver.canonical_board(
+                [symmetry.apply(index) for index in board])[0], canonical)
+            self.assertEqual(tuple(sorted(transform.apply(index)
+                                          for index in board)), canonical)
+            self.assertEqual(sorted(transform.invert(index)
+                                    for index in canonical), sorted(board))
+            self.assertEqual(solver.count_sets(BitBoard(solver, board)),
+                             solver.count_sets(BitBoard(solver, canonical)))
+
+    def test_symmetric_boards_quickly(self):
+        ''' Boards with many symmetries, a grid of two attributes or the
+            whole deck, should not be searched once per symmetry. '''
+        five_hand = {attribute: list(range(5)) for attribute in range(4)}
+        six_hand = {attribute: list(range(6)) for attribute in range(4)}
+        for attributes, board in ((ATTRIBS, range(81)),
+                                  (five_hand, range(625)),
+                                  (five_hand, range(25)),
+                                  (six_hand, range(36))):
+            solver = SetSolver(attributes)
+            start = time.perf_counter()
+            canonical, transform = solver.canonical_board(board)
+            self.assertLess(time.perf_counter() - start, 1.0)
+            self.assertEqual(tuple(sorted(transform.apply(index)
+                                          for index in board)), canonical)
+            symmetry = self.random_symmetry(solver)
+            self.assertEqual(solver.canonical_board(
+                [symmetry.apply(index) for index in board])[0], canonical)
+
+    def test_too_many_choices(self):
+        ''' A board needing more than max_choices tried should be its own
+            representative, and still cache its sets correctly. '''
+        solver = SetSolver(ATTRIBS)
+        board = random.sample(range(81), 12)
+        canonical, transform = solver.canonical_board(board, max_choices=1)
+        self.assertEqual(canonical, tuple(sorted(board)))
+        self.assertEqual([transform.apply(index) for index in board], board)
+
+        # A grid with each attribute repeated ties every labelling with
+        # another, more than the default allows with seven variations.
+        seven_hand = {attribute: list(range(7)) for attribute in range(4)}
+        solver = SetSolver(seven_hand)
+        board = [solver._digits_to_index((first, second, first, second))
+                 for first in range(7) for second in range(7)]
+        start = time.perf_counter()
+        canonical, _ = solver.canonical_board(board)
+        self.assertLess(time.perf_counter() - start, 5.0)
+        self.assertEqual(canonical, tuple(sorted(board)))
+
+    def test_one_per_class(self):
+        ''' A small deck's boards should have as many representatives as
+            applying every symmetry finds classes. '''
+        solver = SetSolver({'shape': [0, 1, 2], 'number': [0, 1, 2]})
+        symmetries = [BoardTransform(solver, columns, labels)
+                      for columns in permutations(range(2))
+                      for labels in product(permutations(range(3)),
+                                            repeat=2)]
+        for size in (3, 4, 5):
+            classes, representatives = set(), set()
+            for board in combinations(range(9), size):
+                classes.add(min(tuple(sorted(symmetry.apply(index)
+                                             for index in board))
+                                for symmetry in symmetries))
+                representatives.add(solver.canonical_board(board)[0])
+            self.assertEqual(len(representatives), len(classes))
+
+    def test_rules_limit_symmetries(self):
+        ''' Only attributes under the same rule trade places, and
+            attributes under a function keep their labels. '''
+        solver = SetSolver(ATTRIBS, SetRules(rules={
+            'colors': 'same', 'number': lambda hand: 0 in hand}))
+        _, transform = solver.canonical_board(random.sample(range(81), 12))
+        names = list(ATTRIBS)
+        for slot, column in enumerate(transform.columns):
+            self.assertEqual(solver.rules.rule(names[column]),
+                             solver.rules.rule(names[slot]))
+        number = names.index('number')
+        self.assertEqual(transform.columns[number], number)
+        self.assertEqual(transform.labels[number], (0, 1, 2))
+
+    def test_canonical_cache(self):
+        ''' A canonical SetCache should answer symmetric boards from one
+            entry, mapped back onto each board's cards. '''
+        solver = SetSolver(ATTRIBS)
+        cache = SetCache(solver, canonical=True)
+        board = random.sample(range(81), 15)
+        for _ in range(5):
+            symmetry = self.random_symmetry(solver)
+            cards = [solver.compact_card(symmetry.apply(index))
+                     for index in board]
+            self.assertEqual(cache.find_all_sets(cards),
+                             solver.find_all_sets(cards))
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (4, 1, 1))
+
+
+class TestSetTable(unittest.TestCase):
+    ''' Test solving with a precomputed SetTable. '''
+
+    def test_matches_search(self):
+        ''' Table lookups should find the same sets as the search, for 3
+            and 4 variant games. '''
+        four_hand  = {'colors': ['red', 'blue', 'yellow', 'green'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot'],
+                      'number': ['one', 'two', 'three', 'four']}
+        for attributes in (ATTRIBS, four_hand):
+            solver = SetSolver(attributes)
+            tabled = SetSolver(attributes)
+            table = tabled.use_table()
+            self.assertEqual(len(table),
+                             pow(solver._hand_size,
+                                 4 * (solver._hand_size - 1)))
+            board = [Card(card.attributes, randomize=False)
+                     for card in solver.deal_game(3) * 4]
+            board += solver.deal_game(21)
+            self.assertEqual(tabled.find_all_sets(board),
+                             solver.find_all_sets(board))
+            self.assertEqual(tabled.count_sets(board),
+                             solver.count_sets(board))
+
+            for a_set in solver.find_all_sets(board):
+                a_set = [solver.encode_card(card).index for card in a_set]
+                self.assertEqual(table.completion(a_set[:-1]), a_set[-1])
+        # Two of a card and one other make no set of four.
+        self.assertIsNone(table.completion([0, 0, 1]))
+
+    def test_saved_table(self):
+        ''' A saved table should be mapped back rather than rebuilt, and
+            solve_many workers should be able to share it. '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'three.table')
+
+        solver = SetSolver(ATTRIBS)
+        built = solver.use_table(path)
+        self.assertIsNone(built._mmap)
+        mapped = SetTable(solver, path)
+        self.addCleanup(mapped.close)
+        self.assertIsNotNone(mapped._mmap)
+        self.assertEqual(list(mapped.table), list(built.table))
+
+        self.assertEqual(solve_many(ATTRIBS, 12, 40, workers=1,
+                                    chunk_size=10, table=path),
+                         solve_many(ATTRIBS, 12, 40, workers=1,
+                                    chunk_size=10))
+
+    def test_workers_build_missing_table(self):
+        ''' solve_many workers given a table file that is not there yet
+            should each build and save it without tripping over each other,
+            leaving just the table behind. '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        expected = solve_many(ATTRIBS, 12, 200, workers=1, chunk_size=10)
+        for attempt in range(3):
+            path = os.path.join(directory, '{}.table'.format(attempt))
+            self.assertEqual(solve_many(ATTRIBS, 12, 200, workers=4,
+                                        chunk_size=10, table=path),
+                             expected)
+
+        # Another process saving the same table between this one's write
+        # and its rename.
+        path = os.path.join(directory, 'raced.table')
+        replace = os.replace
+        raced = []
+
+        def race_then_replace(source, destination):
+            if not raced:
+                raced.append(source)
+                SetTable(SetSolver(ATTRIBS), path)
+            replace(source, destination)
+
+        with mock.patch('set_solver.os.replace', race_then_replace):
+            table = SetTable(SetSolver(ATTRIBS), path)
+        mapped = SetTable(SetSolver(ATTRIBS), path)
+        self.addCleanup(mapped.close)
+        self.assertEqual(list(mapped.table), list(table.table))
+        self.assertEqual(sorted(os.listdir(directory)),
+                         ['0.table', '1.table', '2.table', 'raced.table'])
+
+    def test_bad_tables(self):
+        ''' Tables for another deck, tables too large to build and games
+            with no unique completions should raise ValueError. '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'three.table')
+        SetTable(SetSolver(ATTRIBS), path)
+
+        three_attributes = {'colors': ['red', 'blue', 'yellow'],
+                            'number': ['one', 'two', 'three']}
+        two_hand = {'colors': ['red', 'blue'], 'number': ['one', 'two']}
+        self.assertRaises(ValueError, SetTable,
+                          SetSolver(three_attributes), path)
+        self.assertRaises(ValueError, SetTable, SetSolver(ATTRIBS),
+                          max_entries=100)
+        self.assertRaises(ValueError, SetTable, SetSolver(two_hand))
+
+
+class TestDeckAndGame(unittest.TestCase):
+    ''' Test the stateful Deck and Game classes. '''
+
+    def test_full_deck(self):
+        ''' A Deck should hold every card once, shuffled reproducibly. '''
+        four_hand  = {'colors': ['red', 'blue', 'yellow', 'green'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot'],
+                      'number': ['one', 'two', 'three', 'four']}
+        deck = Deck(attribs=four_hand, seed=3)
+        self.assertEqual(deck.size, 256)
+        self.assertEqual(len({tuple(card.attributes.values())
+                              for card in deck.cards}), 256)
+        self.assertEqual([card.attributes for card in deck.cards],
+                         [card.attributes
+                          for card in Deck(attribs=four_hand, seed=3).cards])
+        self.assertEqual(Deck(shuffle=False).cards[1].attributes,
+                         {'colors': 'red', 'shape': 'circle', 'fill': 'none',
+                          'number': 'two'})
+
+    def test_deal(self):
+        ''' Dealing should hand out each card once, then raise. '''
+        deck = Deck(size=10, seed=1)
+        dealt = deck.deal(4) + deck.deal(4) + deck.deal(4)
+        self.assertEqual(len(deck), 0)
+        self.assertEqual(dealt, deck.cards)
+        self.assertRaises(IndexError, deck.deal)
+
+    def test_check(self):
+        ''' Taking a set should replace its cards; a non-set changes
+            nothing. '''
+        game = Game(deck=Deck(seed=5))
+        while not game.sets():
+            game.deal_more()
+        num_visible = len(game.visible)
+        pset = game.sets()[0]
+        not_a_set = [game.visible[0], game.visible[0], game.visible[1]]
+
+        self.assertFalse(game.check(not_a_set))
+        self.assertEqual(len(game.visible), num_visible)
+        # Three of one card score as a set but can't be taken.
+        self.assertFalse(game.check([game.visible[0]] * 3))
+        self.assertFalse(game.check(pset[:2]))
+        self.assertEqual(len(game.visible), num_visible)
+        self.assertEqual(len(game.index), num_visible)
+        self.assertTrue(game.check(pset))
+        for card in pset:
+            self.assertNotIn(card, game.visible)
+        self.assertEqual(len(game.visible), max(12, num_visible - 3))
+        self.assertFalse(game.check(pset))
+
+    def test_simulate_game(self):
+        ''' A simulated game should use up the deck and be reproducible. '''
+        sets_taken, cards_left = simulate_game(seed=11)
+        self.assertEqual(sets_taken * 3 + cards_left, 81)
+        self.assertEqual(simulate_game(seed=11), (sets_taken, cards_left))
+
+        game = Game(deck=Deck(seed=11))
+        for _ in range(sets_taken):
+            while not game.sets():
+                game.deal_more()
+            game.check(game.sets()[0])
+        self.assertEqual(len(game.deck), 0)
+        self.assertFalse(game.sets())
+
+        # choose is handed the visible sets as deck indices.
+        solver = SetSolver(ATTRIBS)
+        chosen = []
+
+        def last_set(sets):
+            chosen.append(sets)
+            return sets[-1]
+
+        sets_taken, cards_left = simulate_game(seed=11, choose=last_set,
+                                               solver=solver)
+        self.assertEqual(sets_taken * 3 + cards_left, 81)
+        self.assertTrue(all(solver.check_for_set(
+            [solver.compact_card(index) for index in a_set])
+            for sets in chosen for a_set in sets))
+
+
+class TestSolveMany(unittest.TestCase):
+    ''' Test batch solving of random boards. '''
+
+    def test_histogram(self):
+        ''' Every board should be counted, matching count_sets. '''
+        four_hand  = {'colors': ['red', 'blue', 'yellow', 'green'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot'],
+                      'number': ['one', 'two', 'three', 'four']}
+        histogram = solve_many(four_hand, 81, 20, seed=4, workers=1,
+                               chunk_size=20)
+        self.assertEqual(sum(histogram.values()), 20)
+
+        # An 81 card board of the three variant game is the whole deck.
+        three_solver = SetSolver(Deck().attribs)
+        all_sets = three_solver.count_sets(Deck().cards)
+        self.assertEqual(solve_many(Deck().attribs, 81, 3, workers=1),
+                         {all_sets: 3})
+
+    def test_deterministic_across_workers(self):
+        ''' Results should not depend on the number of workers. '''
+        three_hand = {'colors': ['red', 'blue', 'yellow'],
+                      'shape':  ['circle', 'square', 'diamond'],
+                      'fill':   ['none', 'stripe', 'solid'],
+                      'number': ['one', 'two', 'three']}
+        serial = solve_many(three_hand, 12, 300, seed=9, workers=1,
+                            chunk_size=50)
+        self.assertEqual(sum(serial.values()), 300)
+        self.assertEqual(solve_many(three_hand, 12, 300, seed=9, workers=2,
+                                    chunk_size=50), serial)
+        self.assertNotEqual(solve_many(three_hand, 12, 300, seed=10,
+                                       workers=1, chunk_size=50), serial)
+
+
+class TestInstrumentation(unittest.TestCase):
+    ''' Test SetSolver's instrumentation hooks. '''
+
+    def test_hooks(self):
+        ''' Hooks should get stats for each search until removed. '''
+        four_hand  = {'colors': ['red', 'blue', 'yellow', 'green'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot'],
+                      'number': ['one', 'two', 'three', 'four']}
+        four_solver = SetSolver(four_hand)
+        game = four_solver.deal_game(16)
+        game += [game[0]] * 3
+        calls = []
+
+        four_solver.add_hook(calls.append)
+        sets = four_solver.find_all_sets(game)
+        four_solver.has_set(game)
+        four_solver.remove_hook(calls.append)
+        four_solver.count_sets(game)
+
+        self.assertEqual([stats.method for stats in calls],
+                         ['find_all_sets', 'has_set'])
+        stats = calls[0]
+        self.assertEqual(stats.num_cards, 19)
+        self.assertEqual(stats.hands_accepted, len(sets))
+        self.assertGreater(stats.hands_examined,
+                           sum(stats.rejections.values()))
+        self.assertTrue(set(stats.rejections) <= set(four_hand))
+        self.assertGreaterEqual(stats.wall_time, 0)
+        self.assertLessEqual(calls[1].hands_examined, stats.hands_examined)
+
+    def test_instrumented_capture(self):
+        ''' instrumented should collect stats and any profile asked for. '''
+        three_hand = {'colors': ['red', 'blue', 'yellow'],
+                      'shape':  ['circle', 'square', 'diamond'],
+                      'fill':   ['none', 'stripe', 'solid'],
+                      'number': ['one', 'two', 'three']}
+        three_solver = SetSolver(three_hand)
+        game = three_solver.deal_game(12)
+
+        with three_solver.instrumented(capture='cprofile') as record:
+            three_solver.find_all_sets(game)
+        self.assertEqual(record.calls[0].hands_examined, 66)
+        self.assertIsNotNone(record.profile)
+
+        with three_solver.instrumented(capture='tracemalloc') as record:
+            three_solver.find_all_sets(game)
+        self.assertIsNotNone(record.snapshot)
+        self.assertIsNone(three_solver._hooks)
+        self.assertRaises(ValueError, three_solver.instrumented('gprof')
+                          .__enter__)
+
+
+class TestFindSetsByCompletion(unittest.TestCase):
+    ''' Test the pair completion search used for three variant games. '''
+
+    def test_matches_combination_search(self):
+        ''' Completion search should find the same sets, in the same order,
+            as scoring every combination. '''
+        three_hand = {'colors': ['red', 'blue', 'yellow'],
+                      'shape':  ['circle', 'square', 'diamond'],
+                      'fill':   ['none', 'stripe', 'solid'],
+                      'number': ['one', 'two', 'three']}
+        three_solver = SetSolver(three_hand)
+
+        for num_cards in (3, 12, 21, 30):
+            game = three_solver.deal_game(num_cards)
+            self.assertEqual(three_solver.find_all_sets(game),
+                             three_solver._find_sets_by_combination(game))
+
+    def test_duplicate_cards(self):
+        ''' Repeated cards each count towards their own sets. '''
+        three_hand = {'colors': ['red', 'blue', 'yellow'],
+                      'shape':  ['circle', 'square', 'diamond'],
+                      'fill':   ['none', 'stripe', 'solid'],
+                      'number': ['one', 'two', 'three']}
+        red_circle = Card({'colors': 'red', 'shape': 'circle', 'fill': 'none',
+                           'number': 'one'}, randomize=False)
+        three_solver = SetSolver(three_hand)
+
+        self.assertEqual(len(three_solver.find_all_sets([red_circle] * 4)), 4)
+
+
+class TestCompactCard(unittest.TestCase):
+    ''' Test conversion between Cards and CompactCards. '''
+
+    def test_round_trip(self):
+        ''' Encoding then decoding a Card should give back its attributes. '''
+        four_hand  = {'colors': ['red', 'blue', 'yellow', 'green'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot'],
+                      'number': ['one', 'two', 'three', 'four']}
+        four_solver = SetSolver(four_hand)
+
+        for card in four_solver.deal_game(20):
+            compact = four_solver.encode_card(card)
+            self.assertIsInstance(compact, CompactCard)
+            self.assertEqual(four_solver.decode_card(compact).attributes,
+                             card.attributes)
+            self.assertEqual(four_solver.compact_card(compact.index), compact)
+
+    def test_index_order(self):
+        ''' Indices should count through the deck, first attribute most
+            significant. '''
+        three_hand = {'colors': ['red', 'blue', 'yellow'],
+                      'shape':  ['circle', 'square', 'diamond'],
+                      'fill':   ['none', 'stripe', 'solid'],
+                      'number': ['one', 'two', 'three']}
+        three_solver = SetSolver(three_hand)
+        card = Card({'colors': 'blue', 'shape': 'circle', 'fill': 'none',
+                     'number': 'three'}, randomize=False)
+
+        self.assertEqual(three_solver.encode_card(card).index, 29)
+        self.assertEqual(three_solver.compact_card(29).digits, (1, 0, 0, 2))
+        self.assertFalse(hasattr(three_solver.compact_card(29), '__dict__'))
+
+    def test_deck_index(self):
+        ''' deck_index should read every form of card, and refuse indices
+            outside the deck. '''
+        solver = SetSolver(ATTRIBS)
+        card = Card({'colors': 'blue', 'shape': 'circle', 'fill': 'none',
+                     'number': 'three'}, randomize=False)
+        forms = [29, solver.encode_card(card), card]
+        if numpy is not None:
+            forms.append(numpy.int64(29))
+        for form in forms:
+            index = solver.deck_index(form)
+            self.assertEqual(index, 29)
+            self.assertIs(type(index), int)
+        for index in (-1, 81):
+            self.assertRaises(ValueError, solver.deck_index, index)
+
+    def test_compact_sets(self):
+        ''' CompactCards should score and solve the same as Cards. '''
+        five_hand  = {'colors': ['red', 'blue', 'yellow', 'green', 'purple'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval', 'zig'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot', 'zag'],
+                      'number': ['one', 'two', 'three', 'four', 'five']}
+        five_solver = SetSolver(five_hand)
+        game = five_solver.deal_game(12)
+        compact_game = [five_solver.encode_card(card) for card in game]
+
+        self.assertEqual(
+            [[five_solver.encode_card(card) for card in hand]
+             for hand in five_solver.find_all_sets(game)],
+            [list(hand) for hand in five_solver.find_all_sets(compact_game)])
+
+
+class TestFindSetsBySearch(unittest.TestCase):
+    ''' Test the pruned search used for games of four or more variants. '''
+
+    def test_matches_combination_search(self):
+        ''' Pruned search should find the same sets, in the same order, as
+            scoring every combination. '''
+        four_hand  = {'colors': ['red', 'blue', 'yellow', 'green'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot'],
+                      'number': ['one', 'two', 'three', 'four']}
+        five_hand  = {'colors': ['red', 'blue', 'yellow', 'green', 'purple'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval', 'zig'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot', 'zag'],
+                      'number': ['one', 'two', 'three', 'four', 'five']}
+        n = random.randrange(6, 8)
+        n_hand = {key: [value for value in range(n)]
+                  for key in range(n)}
+        n_hand['number'] = [value for value in range(n)]
+
+        for attributes, num_cards in ((four_hand, 24), (five_hand, 18),
+                                      (n_hand, n + 8)):
+            solver = SetSolver(attributes)
+            game = solver.deal_game(num_cards)
+            # Repeat cards so every board has sets to find.
+            size = len(attributes['number'])
+            game = game[:2] * size + game[2:]
+            random.shuffle(game)
+            sets = solver.find_all_sets(game)
+            self.assertTrue(sets)
+            self.assertEqual(sets, solver._find_sets_by_combination(game))
+
+    def test_one_of_each(self):
+        ''' A hand of all different variations should be found. '''
+        four_hand  = {'colors': ['red', 'blue', 'yellow', 'green'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot'],
+                      'number': ['one', 'two', 'three', 'four']}
+        four_solver = SetSolver(four_hand)
+        hand = [four_solver.compact_card(index) for index in (0, 85, 170, 255)]
+
+        self.assertEqual(four_solver.find_all_sets(hand), [tuple(hand)])
+
+
+class TestThreadedSearch(unittest.TestCase):
+    ''' Test the threaded search find_all_sets uses on free-threaded
+        builds. The threads run here whether or not the GIL is on. '''
+
+    def test_matches_serial_search(self):
+        ''' Threads should find the sets the serial search finds, in the
+            same order, however many there are. '''
+        five_hand  = {'colors': ['red', 'blue', 'yellow', 'green', 'purple'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval', 'zig'],
+                      'number': ['one', 'two', 'three', 'four', 'five']}
+        for attributes, rules, num_cards in ((ATTRIBS, None, 21),
+                                             (five_hand, None, 40),
+                                             (five_hand, SetRules(3), 40),
+                                             (five_hand, SetRules(
+                                                 3, default='same'), 40)):
+            solver = SetSolver(attributes, rules)
+            game = solver.deal_game(num_cards // 2)
+            # Repeat cards so every board has sets to find.
+            game = game * 2 + [game[0]] * 3
+            random.shuffle(game)
+            digits = solver._encode_board(game)
+            expected = [prefix + (last,) for prefix, lasts
+                        in solver._iter_completions(digits)
+                        for last in lasts]
+            self.assertTrue(expected)
+            for threads in (1, 2, 3, 8):
+                self.assertEqual(solver._threaded_search(digits, threads),
+                                 expected)
+            self.assertEqual(solver.find_all_sets(game, threads=4),
+                             solver.find_all_sets(game))
+        self.assertEqual(solver._threaded_search(digits[:2], 2), [])
+        self.assertRaises(ValueError, solver.find_all_sets, game, threads=0)
+
+    def test_hooks(self):
+        ''' Hooks should get one search's stats, summed over the threads. '''
+        solver = SetSolver(ATTRIBS)
+        game = solver.deal_game(15)
+        game += [game[0]] * 2
+        digits = solver._encode_board(game)
+        calls = []
+        solver.add_hook(calls.append)
+        sets = solver._threaded_search(digits, 3)
+        solver.remove_hook(calls.append)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0].method, 'find_all_sets')
+        self.assertEqual(calls[0].hands_accepted, len(sets))
+        self.assertGreater(calls[0].hands_examined, 0)
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestVectorizedSets(unittest.TestCase):
+    ''' Test SetSolver's numpy batch search. '''
+
+    def test_matches_find_all_sets(self):
+        ''' Batch scoring should agree with find_all_sets for 3, 4, 5 and
+            random n variant games. '''
+        four_hand  = {'colors': ['red', 'blue', 'yellow', 'green'],
+                      'shape':  ['circle', 'square', 'diamond', 'oval'],
+                      'fill':   ['none', 'stripe', 'solid', 'polkadot'],
+                      'number': ['one', 'two', 'three', 'four']}
+        n = random.randrange(5, 8)
+        n_hand = {key: [value for value in range(n)]
+                  for key in range(n)}
+        n_hand['number'] = [value for value in range(n)]
+
+        for attributes, num_cards in ((four_hand, 16), (n_hand, n + 6)):
+            solver = SetSolver(attributes)
+            game = solver.deal_game(num_cards)
+            # Repeat a card so there is always at least one set to find.
+            game += [game[0]] * (len(attributes['number']) - 1)
+            self.assertEqual(solver.find_all_sets_vectorized(game, 100),
+                             solver.find_all_sets(game))
+
+    def test_chunk_sizes(self):
+        ''' Any chunk size should give the same sets in the same order. '''
+        solver = SetSolver(ATTRIBS)
+        game = solver.deal_game(7) * 2
+        for chunk_size in (1, 2, 5, 64, 65536):
+            self.assertEqual(solver.find_all_sets_vectorized(game, chunk_size),
+                             solver.find_all_sets(game))
+
+    def test_two_sets(self):
+        ''' Batch scoring should find both sets on a three variant board. '''
+        three_hand = {'colors': ['red', 'blue', 'yellow'],
+                      'shape':  ['circle', 'square', 'diamond'],
+                      'fill':   ['none', 'stripe', 'solid'],
+                      'number': ['one', 'two', 'three']}
+        red_circle = Card({'colors': 'red', 'shape': 'circle', 'fill': 'none',
+                           'number': 'one'}, randomize=False)
+        blue_square = Card({'colors': 'blue', 'shape': 'square',
+                            'fill': 'stripe', 'number': 'two'},
+                           randomize=False)
+        three_solver = SetSolver(three_hand)
+        game = [red_circle] * 3 + [blue_square] * 3
+
+        self.assertEqual(len(three_solver.find_all_sets_vectorized(game)), 2)
+        self.assertEqual(three_solver.find_all_sets_vectorized(game[:2]), [])
+        self.assertEqual(three_solver.find_all_sets_vectorized([]),
+                         three_solver.find_all_sets([]))
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestDealBoards(unittest.TestCase):
+    ''' Test dealing many boards at once as arrays of deck indices. '''
+
+    def test_boards(self):
+        ''' Boards should hold different cards, from the whole deck, the
+            same for the same seed, for small and large boards alike. '''
+        solver = SetSolver(ATTRIBS)
+        for board_size in (3, 12, 81):
+            boards = solver.deal_boards(500, board_size, seed=4)
+            self.assertEqual(boards.shape, (500, board_size))
+            for board in boards.tolist():
+                self.assertEqual(len(set(board)), board_size)
+            self.assertEqual(boards.min(), 0)
+            self.assertEqual(boards.max(), 80)
+            self.assertTrue((boards == solver.deal_boards(
+                500, board_size, seed=4)).all())
+        self.assertFalse((solver.deal_boards(5, seed=1) ==
+                          solver.deal_boards(5, seed=2)).all())
+        self.assertRaises(ValueError, solver.deal_boards, 1, 82)
+
+    def test_board_cards(self):
+        ''' Rows should solve as cards or as BitBoards alike. '''
+        solver = SetSolver(ATTRIBS)
+        board = solver.deal_boards(1, 15, seed=5)[0]
+        cards = solver.board_cards(board)
+        self.assertEqual([solver.encode_card(card).index for card in cards],
+                         board.tolist())
+        self.assertEqual(solver.count_sets(cards),
+                         solver.count_sets(BitBoard(solver, board.tolist())))
+        # Rows can be used as they come, without tolist().
+        self.assertEqual(BitBoard(solver, board),
+                         BitBoard(solver, board.tolist()))
+        self.assertEqual(solver.canonical_board(board)[0],
+                         solver.canonical_board(board.tolist())[0])
+
+
 class TestGameDealing(unittest.TestCase):
     ''' Test SetSolver's .deal_game method '''
 
@@ -363,5 +1345,98 @@ class TestGameDealing(unittest.TestCase):
         for card in hand:
             self.assertIsInstance(card, Card)
 
+
+class TestSetRules(unittest.TestCase):
+    ''' Test games played by other rules. '''
+    five_hand = {'colors': ['red', 'blue', 'yellow', 'green', 'purple'],
+                 'shape':  ['circle', 'square', 'diamond', 'oval', 'zig'],
+                 'fill':   ['none', 'stripe', 'solid', 'polkadot', 'zag'],
+                 'number': ['one', 'two', 'three', 'four', 'five']}
+
+    def brute_force(self, solver, cards):
+        ''' Find sets by checking each attribute of each combination
+            against its rule directly. '''
+        checks = {'same': lambda hand: len(set(hand)) == 1,
+                  'different': lambda hand: len(set(hand)) == len(hand),
+                  'any': lambda hand: True}
+        checks['same_or_different'] = lambda hand: (
+            checks['same'](hand) or checks['different'](hand))
+        sets = []
+        for hand in combinations(cards, solver._hand_size):
+            for attribute, variations in solver.attributes.items():
+                rule = solver.rules.rule(attribute)
+                check = rule if callable(rule) else checks[rule]
+                if not check(tuple(sorted(
+                        variations.index(card.attributes[attribute])
+                        for card in hand))):
+                    break
+            else:
+                sets.append(hand)
+        return sets
+
+    def test_matches_brute_force(self):
+        ''' Every kind of rule should find the sets checking them directly
+            does, in the same order. '''
+        for rules in (SetRules(3), SetRules(4, default='different'),
+                      SetRules(2, default='same'), SetRules(6),
+                      SetRules(rules={'colors': 'same', 'shape': 'any',
+                                      'fill': 'different'}),
+                      SetRules(3, rules={'number': lambda hand:
+                                         sum(hand) % 5 == 0})):
+            solver = SetSolver(self.five_hand, rules)
+            game = solver.deal_game(18)
+            game = game[:1] * solver._hand_size + game
+            self.assertEqual(solver.find_all_sets(game),
+                             self.brute_force(solver, game))
+            for hand in combinations(game[:8], solver._hand_size):
+                self.assertEqual(solver.check_for_set(hand),
+                                 hand in self.brute_force(solver, hand))
+
+    def test_smaller_sets(self):
+        ''' Three card sets of five variations: all same or all different
+            per attribute, but with variations left over. '''
+        solver = SetSolver(self.five_hand, SetRules(3))
+        hand = [solver.compact_card(index) for index in (0, 1, 2)]
+        self.assertTrue(solver.check_for_set(hand))
+        self.assertFalse(solver.check_for_set(hand[:2] + hand[:1]))
+        self.assertRaises(TypeError, solver.check_for_set, hand[:2])
+        self.assertEqual(solver.find_all_sets(hand), [tuple(hand)])
+
+    def test_board_index(self):
+        ''' BoardIndex should follow the solver's rules. '''
+        solver = SetSolver(self.five_hand, SetRules(
+            3, rules={'colors': 'same', 'shape': 'any'}))
+        game = Deck(size=30, attribs=self.five_hand, seed=3).cards
+        index = BoardIndex(solver, game)
+        self.assertTrue(index.sets())
+        self.assertEqual(set(index.sets()), set(solver.find_all_sets(game)))
+
+    def test_without_number(self):
+        ''' Attributes need not include number. '''
+        solver = SetSolver({'colors': ['red', 'blue', 'yellow'],
+                            'shape':  ['circle', 'square', 'diamond']})
+        game = solver.deal_game(9)
+        self.assertEqual(solver.find_all_sets(game),
+                         solver._find_sets_by_combination(game))
+
+    def test_bad_rules(self):
+        ''' Unknown rules and attributes should be refused. '''
+        self.assertRaises(ValueError, SetRules, default='odd')
+        self.assertRaises(ValueError, SetRules, 1)
+        self.assertRaises(ValueError, SetSolver, self.five_hand,
+                          SetRules(rules={'size': 'same'}))
+        self.assertRaises(ValueError, SetTable,
+                          SetSolver(self.five_hand, SetRules(3)))
+
+    def test_compiled_once(self):
+        ''' Solvers of the same attributes and rules share their lookup
+            tables; other rules get their own. '''
+        one = SetSolver(self.five_hand, SetRules(3))
+        two = SetSolver(self.five_hand, SetRules(3))
+        usual = SetSolver(self.five_hand)
+        self.assertIs(one._valid_scores, two._valid_scores)
+        self.assertIsNot(one._valid_scores, usual._valid_scores)
+
+
 if __name__ == '__main__':
     unittest.main()
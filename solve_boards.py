@@ -0,0 +1,286 @@
+# usr/bin/env python3
+
+# Solve boards in bulk, streaming them from a file and writing each board's
+# sets as soon as they are found:
+#
+#    python3 solve_boards.py boards.jsonl -o sets.jsonl --preset five
+#    python3 solve_boards.py boards.bin --format binary --workers 4 --count
+#
+# JSON lines input holds one board per line, either a list of cards or an
+# object with a "cards" list and an optional "id". A card can be its index
+# in the solver's deck order, a list of its variations in attribute order,
+# or a dict of attribute to variation. Cards go straight to variant indices,
+# never through Card objects. Blank lines are skipped; any other line that
+# is not a board stops the run with an error naming it.
+#
+# Binary input is a run of boards, each a little-endian uint16 count of
+# cards followed by that many uint16 deck indices; write_binary makes it.
+# Archive input is a set_archive file, whose board records are solved with
+# the attributes in its header.
+#
+# Each output line is a JSON object with the board's id and its sets, as
+# lists of positions on the board, or with --count just how many there are.
+# Boards are read, solved and written a batch at a time, with at most a few
+# batches in flight, so memory stays flat however big the input is.
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from collections import deque
+from itertools import islice
+from numbers import Integral
+
+from play_set import three_hand, four_hand, five_hand
+from set_archive import Archive
+from set_solver import SetSolver
+
+
+PRESETS = {'three': three_hand, 'four': four_hand, 'five': five_hand}
+_COUNT = struct.Struct('<H')
+
+
+class BoardReader(object):
+    ''' Read boards from a binary file object as (id, deck indices) pairs.
+        bytes_read counts the input consumed, for progress reports.
+        :param solver: the SetSolver whose deck the cards come from.
+        :param stream: file object opened in binary mode, or an Archive.
+        :param binary: read the binary format rather than JSON lines. '''
+    def __init__(self, solver, stream, binary=False):
+        self.solver = solver
+        self.stream = stream
+        self.binary = binary
+        self.bytes_read = 0
+        self._deck_size = solver.deck_size
+
+    def __iter__(self):
+        if isinstance(self.stream, Archive):
+            return self._read_archive()
+        elif self.binary:
+            return self._read_binary()
+        return self._read_jsonl()
+
+    def _read_jsonl(self):
+        for number, line in enumerate(self.stream):
+            self.bytes_read += len(line)
+            if not line.strip():
+                continue
+            try:
+                board = json.loads(line)
+                board_id = number
+                if isinstance(board, dict):
+                    board_id = board.get('id', number)
+                    if 'cards' not in board:
+                        raise ValueError('Board has no "cards".')
+                    board = board['cards']
+                if not isinstance(board, list):
+                    raise ValueError('Board is not a list of cards.')
+                indices = [self.card_index(card) for card in board]
+            except ValueError as error:
+                raise ValueError('Line {}: {}'.format(number + 1, error))
+            yield board_id, indices
+
+    def _read_binary(self):
+        number = 0
+        while True:
+            header = self.stream.read(_COUNT.size)
+            if not header:
+                return
+            if len(header) < _COUNT.size:
+                raise ValueError('Board {} is cut short.'.format(number))
+            size, = _COUNT.unpack(header)
+            indices = array('H')
+            data = self.stream.read(size * indices.itemsize)
+            if len(data) < size * indices.itemsize:
+                raise ValueError('Board {} is cut short.'.format(number))
+            indices.frombytes(data)
+            if sys.byteorder != 'little':
+                indices.byteswap()
+            self.bytes_read += len(header) + len(data)
+            for index in indices:
+                if index >= self._deck_size:
+                    raise ValueError('Card {} is not in the deck.'.format(
+                        index))
+            yield number, indices.tolist()
+            number += 1
+
+    def _read_archive(self):
+        for number, cards in enumerate(self.stream.boards()):
+            self.bytes_read += cards.nbytes
+            yield number, cards.tolist()
+
+    def card_index(self, card):
+        ''' Return the deck index of a card given as an index, a list of
+            variations in attribute order or a dict of attributes. Raise
+            ValueError for anything else, or a card not in the deck. '''
+        solver = self.solver
+        if isinstance(card, Integral):
+            return solver.deck_index(card)
+        if isinstance(card, dict):
+            missing = [attribute for attribute in solver.attributes
+                       if attribute not in card]
+            if missing:
+                raise ValueError('Card {} has no {}.'.format(
+                    card, ', '.join(missing)))
+            card = [card[attribute] for attribute in solver.attributes]
+        elif not isinstance(card, (list, tuple)):
+            raise ValueError('Card {!r} is not an index, a list of '
+                             'variations or a dict of attributes.'.format(
+                                 card))
+        elif len(card) != len(solver.attributes):
+            raise ValueError('Card {} does not have one variation per '
+                             'attribute.'.format(card))
+        try:
+            digits = [variants[variation] for variants, variation
+                      in zip(solver._variant_index.values(), card)]
+        except (KeyError, TypeError):
+            raise ValueError('Card {} has a variation not in the '
+                             'deck.'.format(card))
+        return solver._digits_to_index(digits)
+
+
+def write_binary(stream, boards):
+    ''' Write boards, iterables of deck indices, to a binary file object in
+        the format BoardReader reads. '''
+    for board in boards:
+        indices = array('H', board)
+        if sys.byteorder != 'little':
+            indices.byteswap()
+        stream.write(_COUNT.pack(len(indices)))
+        stream.write(indices.tobytes())
+
+
+def solve_board(solver, indices, count_only=False):
+    ''' Return the sets on a board of deck indices as tuples of positions,
+        in the order find_all_sets gives them, or with count_only how many
+        there are. '''
+    digits = [solver._index_to_digits(index) for index in indices]
+    found = solver._search('find_all_sets', digits)
+    if count_only:
+        return sum(len(lasts) for _, lasts in found)
+    return [prefix + (last,) for prefix, lasts in found for last in lasts]
+
+
+def solve_stream(attributes, boards, workers=1, batch_size=256,
+                 count_only=False, table=None):
+    ''' Solve (id, deck indices) pairs from boards, generating (id, result)
+        pairs in input order. With more than one worker, or 0 or None for
+        one per CPU, batches of batch_size boards go to a process pool, two
+        per worker in flight at most. table is an optional SetTable path
+        for every solver to map. '''
+    batches = iter(lambda: list(islice(boards, batch_size)), [])
+    if workers == 1:
+        _init_worker(attributes, table)
+        for batch in batches:
+            yield from _solve_batch(batch, count_only)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    in_flight = 2 * (workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(workers or None, initializer=_init_worker,
+                             initargs=(attributes, table)) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.submit(_solve_batch, batch, count_only))
+            if len(pending) >= in_flight:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+_worker_solver = None
+
+
+def _init_worker(attributes, table):
+    global _worker_solver
+    _worker_solver = SetSolver(attributes)
+    if table:
+        _worker_solver.use_table(table)
+
+
+def _solve_batch(batch, count_only):
+    return [(board_id, solve_board(_worker_solver, indices, count_only))
+            for board_id, indices in batch]
+
+
+class Progress(object):
+    ''' Report boards solved and throughput to stream every interval
+        seconds. '''
+    def __init__(self, stream=sys.stderr, interval=5.0):
+        self.stream = stream
+        self.interval = interval
+        self.start = self._last = time.perf_counter()
+
+    def update(self, boards, bytes_read, final=False):
+        now = time.perf_counter()
+        if not final and now - self._last < self.interval:
+            return
+        self._last = now
+        elapsed = max(now - self.start, 1e-9)
+        self.stream.write('{} boards, {:.0f} boards/s, {:.2f} MB/s\n'.format(
+            boards, boards / elapsed, bytes_read / elapsed / 1e6))
+        self.stream.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Solve boards in bulk.')
+    parser.add_argument('input', help='board file, or - for stdin')
+    parser.add_argument('-o', '--output', default='-',
+                        help='file to write results to (default stdout)')
+    parser.add_argument('--format', choices=('jsonl', 'binary', 'archive'),
+                        default='jsonl', help='input format')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='three',
+                        help='preset attributes of the deck')
+    parser.add_argument('--attributes',
+                        help='JSON file of attributes, in place of a preset')
+    parser.add_argument('--count', action='store_true',
+                        help='write how many sets each board has, not them')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes to solve boards in, 0 for one '
+                        'per CPU')
+    parser.add_argument('--batch-size', type=int, default=256,
+                        help='boards sent to a worker at a time')
+    parser.add_argument('--table', help='SetTable file to look sets up in')
+    parser.add_argument('--progress', type=float, default=5.0,
+                        help='seconds between progress reports on stderr')
+    args = parser.parse_args(argv)
+
+    attributes = PRESETS[args.preset]
+    if args.attributes:
+        with open(args.attributes) as attributes_file:
+            attributes = json.load(attributes_file)
+    if args.format == 'archive':
+        source = Archive(args.input)
+        attributes = source.attributes
+    else:
+        source = (sys.stdin.buffer if args.input == '-'
+                  else open(args.input, 'rb'))
+    solver = SetSolver(attributes)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    reader = BoardReader(solver, source, args.format == 'binary')
+    progress = Progress(interval=args.progress)
+    key = 'count' if args.count else 'sets'
+    boards = 0
+    try:
+        for board_id, result in solve_stream(attributes, iter(reader),
+                                             args.workers, args.batch_size,
+                                             args.count, args.table):
+            output.write(json.dumps({'id': board_id, key: result}) + '\n')
+            boards += 1
+            progress.update(boards, reader.bytes_read)
+        progress.update(boards, reader.bytes_read, final=True)
+    except ValueError as error:
+        parser.exit(1, '{}: {}\n'.format(parser.prog, error))
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+# usr/bin/env python
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from play_set import three_hand, four_hand
+from set_archive import ArchiveWriter
+from set_solver import SetSolver
+from solve_boards import (BoardReader, main, solve_board, solve_stream,
+                          write_binary)
+
+
+class TestBoardReader(unittest.TestCase):
+
+    def test_card_forms(self):
+        ''' Cards given as indices, variation lists and attribute dicts
+            should read as the same deck indices. '''
+        solver = SetSolver(three_hand)
+        cards = solver.deal_game(5)
+        indices = [solver.encode_card(card).index for card in cards]
+        lines = [json.dumps(indices),
+                 json.dumps({'id': 'named',
+                             'cards': [[card.attributes[attribute]
+                                        for attribute in three_hand]
+                                       for card in cards]}),
+                 json.dumps([card.attributes for card in cards])]
+        stream = io.BytesIO('\n'.join(lines).encode())
+        reader = BoardReader(solver, stream)
+
+        self.assertEqual(list(reader), [(0, indices), ('named', indices),
+                                        (2, indices)])
+        self.assertEqual(reader.bytes_read, len(stream.getvalue()))
+
+    def test_blank_lines(self):
+        ''' Blank lines should be skipped, keeping later boards' ids as
+            their line numbers. '''
+        stream = io.BytesIO(b'[0, 1]\n\n  \n[2]\n\n')
+        self.assertEqual(list(BoardReader(SetSolver(three_hand), stream)),
+                         [(0, [0, 1]), (3, [2])])
+
+    def test_binary(self):
+        ''' Boards written with write_binary should read back as written. '''
+        solver = SetSolver(four_hand)
+        boards = [[0, 255, 17], [], list(range(100))]
+        stream = io.BytesIO()
+        write_binary(stream, boards)
+        stream.seek(0)
+        self.assertEqual(list(BoardReader(solver, stream, binary=True)),
+                         list(enumerate(boards)))
+
+    def test_bad_boards(self):
+        ''' Cards outside the deck and cut short files should raise
+            ValueError. '''
+        solver = SetSolver(three_hand)
+        for stream, binary in ((io.BytesIO(b'[81]'), False),
+                               (io.BytesIO(b'[["red"]]'), False),
+                               (io.BytesIO(b'[1.5]'), False),
+                               (io.BytesIO(b'["nope"]'), False),
+                               (io.BytesIO(b'[{"color": "red"}]'), False),
+                               (io.BytesIO(b'[[0, 1, 2, 3]]'), False),
+                               (io.BytesIO(b'{"id": 1}'), False),
+                               (io.BytesIO(b'[0]\n[1'), False),
+                               (io.BytesIO(b'\x03\x00\x01\x00'), True),
+                               (io.BytesIO(b'\x01\x00\x51\x00'), True)):
+            self.assertRaises(ValueError, list,
+                              BoardReader(solver, stream, binary))
+
+
+class TestSolveStream(unittest.TestCase):
+
+    def test_in_input_order(self):
+        ''' Streamed results should match solving each board alone, in input
+            order, with or without a worker pool. '''
+        solver = SetSolver(four_hand)
+        boards = [solver.deal_game(16) for _ in range(30)]
+        boards = [(number, [solver.encode_card(card).index for card in board])
+                  for number, board in enumerate(boards)]
+        expected = [(number, solve_board(solver, indices))
+                    for number, indices in boards]
+
+        self.assertEqual(list(solve_stream(four_hand, iter(boards),
+                                           batch_size=7)), expected)
+        self.assertEqual(list(solve_stream(four_hand, iter(boards), workers=2,
+                                           batch_size=7, count_only=True)),
+                         [(number, len(sets)) for number, sets in expected])
+        # 0 workers means one per CPU.
+        self.assertEqual(list(solve_stream(four_hand, iter(boards), workers=0,
+                                           batch_size=7)), expected)
+
+    def test_solve_board(self):
+        ''' solve_board should give sets as positions on the board. '''
+        solver = SetSolver(three_hand)
+        board = solver.deal_game(15)
+        indices = [solver.encode_card(card).index for card in board]
+        self.assertEqual([tuple(board[position] for position in a_set)
+                          for a_set in solve_board(solver, indices)],
+                         solver.find_all_sets(board))
+
+
+class TestMain(unittest.TestCase):
+
+    def test_jsonl_to_jsonl(self):
+        ''' The command line should write one result line per board. '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        boards = os.path.join(directory, 'boards.jsonl')
+        results = os.path.join(directory, 'sets.jsonl')
+        with open(boards, 'w') as boards_file:
+            boards_file.write('[0, 1, 2, 3]\n{"id": "x", "cards": [0, 4]}\n')
+
+        main([boards, '-o', results, '--progress', '0'])
+        with open(results) as results_file:
+            self.assertEqual([json.loads(line) for line in results_file],
+                             [{'id': 0, 'sets': [[0, 1, 2]]},
+                              {'id': 'x', 'sets': []}])
+
+    def test_bad_line(self):
+        ''' A bad line should stop the run with a message naming it, after
+            the boards before it are written. '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        boards = os.path.join(directory, 'boards.jsonl')
+        results = os.path.join(directory, 'sets.jsonl')
+        with open(boards, 'w') as boards_file:
+            boards_file.write('[0, 1, 2]\n[1.5]\n')
+
+        with mock.patch('sys.stderr', io.StringIO()) as stderr:
+            with self.assertRaises(SystemExit):
+                main([boards, '-o', results, '--batch-size', '1',
+                      '--progress', '0'])
+        self.assertIn('Line 2:', stderr.getvalue())
+        with open(results) as results_file:
+            self.assertEqual([json.loads(line) for line in results_file],
+                             [{'id': 0, 'sets': [[0, 1, 2]]}])
+
+    def test_archive(self):
+        ''' Archives should be solved with the attributes in their header. '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        boards = os.path.join(directory, 'boards.set')
+        results = os.path.join(directory, 'sets.jsonl')
+        with ArchiveWriter(open(boards, 'wb'), four_hand) as writer:
+            writer.write_board([0, 85, 170, 255, 1])
+            writer.write_set([0, 85, 170, 255])
+            writer.write_board([0, 1])
+
+        main([boards, '-o', results, '--format', 'archive', '--count',
+              '--progress', '0'])
+        with open(results) as results_file:
+            self.assertEqual([json.loads(line) for line in results_file],
+                             [{'id': 0, 'count': 1}, {'id': 1, 'count': 0}])
+
+
+if __name__ == '__main__':
+    unittest.main()